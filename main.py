@@ -2,44 +2,40 @@
 # IMPORTS DO SISTEMA E TERCEIROS
 # ============================================
 import os
+import re
 import json
-import requests
-import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime
+import time
+import sqlite3
+import hashlib
+import asyncio
+import functools
+import threading
+import queue
+import random
+import shutil
+import csv
+import html
+import contextvars
+import contextlib
+import multiprocessing
+import sys
+from datetime import datetime, timedelta
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+_IMPORT_START = time.perf_counter()
 
-# ============================================
-# GOOGLE API
-# ============================================
-from googleapiclient.discovery import build
-
-# ============================================
-# LANGCHAIN (ATUALIZADO 2025)
-# ============================================
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_groq import ChatGroq
-from langchain_openai import ChatOpenAI
-
-# ============================================
-# REPORTLAB PARA GERAÇÃO DE PDF
-# ============================================
-from reportlab.platypus import (
-    SimpleDocTemplate,
-    Paragraph,
-    Spacer,
-    Table,
-    TableStyle,
-    Image
-)
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
+# ============================================================
+# DEPENDÊNCIAS PESADAS — IMPORTADAS SOB DEMANDA
+# ============================================================
+# pandas, numpy, pyarrow, scikit-learn, matplotlib, wordcloud, reportlab, googleapiclient
+# e os provedores LangChain (todos em requirements.txt) são importados dentro das
+# etapas que os usam. Assim, execuções
+# só de estatísticas/PDF (e os processos de trabalho) sobem rápido e não
+# exigem chaves de API.
 
-# ============================================
-# VISUALIZAÇÃO E NUVEM DE PALAVRAS
-# ============================================
-from wordcloud import WordCloud
+# Orçamento de tempo de importação deste módulo (segundos)
+IMPORT_TIME_BUDGET = 0.5
 
 
 # ============================================================
@@ -54,27 +50,44 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 # CONFIGURAÇÃO DO LLM (Groq — modelos gratuitos)
 # ============================================================
 
-def get_llm(provider="groq"):
+LLM_TIMEOUT_SECONDS = 60
+LLM_TEMPERATURE = 0.1
+LLM_MODELS = {
+    "openai": "gpt-4.1-mini",
+    "groq": "llama-3.1-8b-instant",
+}
+
+@functools.lru_cache(maxsize=None)
+def get_llm(provider="groq", model=None):
     """
     Retorna o LLM escolhido.
     - provider="groq" → modelo Groq (padrão)
     - provider="openai" → modelo OpenAI Mini 1
+    Construído no primeiro uso e memoizado por provedor/modelo.
     """
+    model = model or LLM_MODELS.get(provider, LLM_MODELS["groq"])
 
+    # Retentativas ficam a cargo da camada de failover (ver `invoke_chain`)
     if provider == "openai":
+        from langchain_openai import ChatOpenAI
+
         return ChatOpenAI(
-            model="gpt-4.1-mini",   
-            temperature=0.1
+            model=model,   
+            temperature=LLM_TEMPERATURE,
+            timeout=LLM_TIMEOUT_SECONDS,
+            max_retries=0
         )
 
     # Groq (padrão)
+    from langchain_groq import ChatGroq
+
     return ChatGroq(
-        model="llama-3.1-8b-instant",
-        temperature=0.1
+        model=model,
+        temperature=LLM_TEMPERATURE,
+        timeout=LLM_TIMEOUT_SECONDS,
+        max_retries=0
     )
 
-parser = StrOutputParser()
-
 
 # ============================================================
 # FUNÇÃO: Converter emojis em palavras
@@ -133,17 +146,251 @@ EMOJI_MAP = {
 }
 
 
+_VARIATION_SELECTOR = "\ufe0f"
+_ZWJ = "\u200d"
+_SKIN_TONES = "\U0001F3FB-\U0001F3FF"
+_MODIFIER_CHARS = "\ufe0f\u200d\U0001F3FB\U0001F3FC\U0001F3FD\U0001F3FE\U0001F3FF"
+
+
+def _compile_emoji_expander(emoji_map):
+    """
+    Compila o expansor em uma única passada:
+    - emojis de um codepoint → tabela de `str.translate` (C puro);
+    - sequências de vários codepoints → regex de alternância, maior primeiro.
+    O seletor de variação (U+FE0F) é ignorado nas chaves, então "❤" e "❤️"
+    têm o mesmo tratamento independentemente da ordem do mapa.
+    """
+    lookup = {}
+    for emoji, word in emoji_map.items():
+        lookup.setdefault(emoji.replace(_VARIATION_SELECTOR, ""), word)
+
+    table = str.maketrans({e: f" {w} " for e, w in lookup.items() if len(e) == 1})
+
+    multi = sorted((e for e in lookup if len(e) > 1), key=len, reverse=True)
+    multi_pattern = None
+    if multi:
+        multi_pattern = re.compile("|".join(re.escape(e) for e in multi))
+
+    return table, multi_pattern, lookup
+
+
+_EMOJI_TABLE, _EMOJI_MULTI_PATTERN, _EMOJI_LOOKUP = _compile_emoji_expander(EMOJI_MAP)
+
+# Menor codepoint do mapa: textos abaixo dele (a maioria) não têm o que expandir
+_EMOJI_MIN_CHAR = min(min(e) for e in _EMOJI_LOOKUP)
+
+# Seletor de variação / tom de pele / ZWJ logo após um emoji já expandido
+_EMOJI_MODIFIERS_RE = re.compile(f"(?<=\\S )[{_VARIATION_SELECTOR}{_SKIN_TONES}]+{_ZWJ}?|(?<=\\S ){_ZWJ}")
+
+
+@functools.lru_cache(maxsize=65536)
 def emoji_to_text(text: str) -> str:
-    for emoji, word in EMOJI_MAP.items():
-        text = text.replace(emoji, f" {word} ")
+    if not text or max(text) < _EMOJI_MIN_CHAR:
+        return text.strip()
+
+    if _EMOJI_MULTI_PATTERN is not None:
+        text = _EMOJI_MULTI_PATTERN.sub(lambda m: f" {_EMOJI_LOOKUP[m.group(0)]} ", text)
+
+    text = text.translate(_EMOJI_TABLE)
+
+    # Tons de pele e sequências ZWJ: só paga a regex quando existem
+    if any(ch in text for ch in _MODIFIER_CHARS):
+        text = _EMOJI_MODIFIERS_RE.sub("", text)
+
     return text.strip()
 
 
+def emoji_to_text_batch(texts) -> list:
+    """Expande os emojis de uma lista inteira de comentários."""
+    return [emoji_to_text(t) for t in texts]
+
+
+# ============================================================
+# DETECÇÃO LOCAL DE IDIOMA (perfis de n-gramas, offline)
+# ============================================================
+
+# Abaixo deste nível de confiança, a chain "language" do LLM é consultada
+LANG_CONFIDENCE_THRESHOLD = 0.6
+# Similaridade mínima com o perfil vencedor: abaixo disso o idioma provavelmente
+# não tem perfil (indonésio, turco, polonês...) e a margem relativa não significa nada
+LANG_MIN_SIMILARITY = 0.2
+
+# Textos-semente para os perfis de trigramas (linguagem típica de comentários)
+LANGUAGE_SEED_TEXTS = {
+    "pt": """
+        que música linda demais eu amo essa música não consigo parar de ouvir
+        quem está ouvindo em 2025 essa banda marcou minha infância e minha adolescência
+        me lembra meu pai que saudade daquele tempo muito bom obrigado por essa obra
+        você é incrível a voz dele é perfeita o refrão é muito forte são as melhores
+        ninguém faz mais música assim hoje em dia isso sim é rock nacional de verdade
+        quando eu era criança ouvia com meus irmãos até hoje arrepia coração não tem
+        """,
+    "en": """
+        this song is amazing i love this song so much who is still listening in 2025
+        the voice is perfect and the lyrics hit different this band made my childhood
+        i remember when i was a kid my father used to play this in the car every day
+        they don't make music like this anymore what a masterpiece thank you for this
+        anyone here after the news rest in peace legend you will always be with us
+        """,
+    "es": """
+        qué canción tan hermosa me encanta esta canción quién la escucha en 2025
+        la voz es perfecta y la letra es increíble esta banda marcó mi infancia
+        recuerdo cuando era niño mi padre la ponía en el coche todos los días
+        ya no hacen música como esta una obra maestra gracias por esto saludos desde
+        méxico argentina colombia chile los amo siempre estarán en mi corazón
+        """,
+    "fr": """
+        quelle belle chanson j'adore cette chanson qui l'écoute encore en 2025
+        la voix est parfaite et les paroles sont magnifiques ce groupe a marqué mon enfance
+        je me souviens quand j'étais petit mon père la mettait dans la voiture tous les jours
+        on ne fait plus de musique comme ça aujourd'hui un chef d'oeuvre merci pour ça
+        """,
+    "de": """
+        was für ein wunderschönes lied ich liebe dieses lied wer hört das noch im jahr 2025
+        die stimme ist perfekt und der text ist unglaublich diese band hat meine kindheit geprägt
+        ich erinnere mich als ich ein kind war mein vater hat es jeden tag im auto gespielt
+        so eine musik macht heute niemand mehr ein meisterwerk danke dafür
+        """,
+    "it": """
+        che canzone bellissima adoro questa canzone chi la ascolta ancora nel 2025
+        la voce è perfetta e il testo è incredibile questa band ha segnato la mia infanzia
+        ricordo quando ero bambino mio padre la metteva in macchina tutti i giorni
+        non fanno più musica così oggi un capolavoro grazie per questo vi amo
+        """,
+}
+
+LANGUAGE_ALIASES = {
+    "português": "pt", "portugues": "pt", "portuguese": "pt", "brasileiro": "pt",
+    "inglês": "en", "ingles": "en", "english": "en",
+    "espanhol": "es", "español": "es", "espanol": "es", "spanish": "es",
+    "francês": "fr", "frances": "fr", "français": "fr", "french": "fr",
+    "alemão": "de", "alemao": "de", "deutsch": "de", "german": "de",
+    "italiano": "it", "italian": "it",
+    "japonês": "ja", "japones": "ja", "japanese": "ja",
+    "coreano": "ko", "korean": "ko",
+    "russo": "ru", "russian": "ru",
+}
+
+ISO_639_1_CODES = frozenset("""
+    aa ab ae af ak am an ar as av ay az ba be bg bh bi bm bn bo br bs ca ce ch co cr cs cu cv cy
+    da de dv dz ee el en eo es et eu fa ff fi fj fo fr fy ga gd gl gn gu gv ha he hi ho hr ht hu
+    hy hz ia id ie ig ii ik io is it iu ja jv ka kg ki kj kk kl km kn ko kr ks ku kv kw ky la lb
+    lg li ln lo lt lu lv mg mh mi mk ml mn mr ms mt my na nb nd ne ng nl nn no nr nv ny oc oj om
+    or os pa pi pl ps pt qu rm rn ro ru rw sa sc sd se sg si sk sl sm sn so sq sr ss st su sv sw
+    ta te tg th ti tk tl tn to tr ts tt tw ty ug uk ur uz ve vi vo wa wo xh yi yo za zh zu
+""".split())
+
+_LETTERS_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+
+def normalize_language_code(raw: str) -> str:
+    """
+    Normaliza respostas como "pt-br", "Português", "PT.", "en_US" ou
+    "Language: en" para o código ISO-639-1 ("pt", "en", ...).
+    Retorna "" se nenhuma palavra for um idioma reconhecível.
+    """
+    words = _LETTERS_RE.findall((raw or "").casefold())
+    if not words:
+        return ""
+
+    for word in words:
+        if word in LANGUAGE_ALIASES:
+            return LANGUAGE_ALIASES[word]
+
+    # Códigos com perfil local primeiro ("the language is en" → "en", não "is")
+    codes = [w for w in words if w in ISO_639_1_CODES]
+    for code in codes:
+        if code in LANGUAGE_PROFILES:
+            return code
+    if codes:
+        return codes[0]
+
+    # Uma palavra só com cara de código ISO-639-2/3 ("fil", "haw"): mantém como veio
+    if len(words) == 1 and len(words[0]) in (2, 3):
+        return words[0]
+    return ""
+
+
+def _trigram_profile(text: str) -> dict:
+    counts = {}
+    for word in _LETTERS_RE.findall(text.casefold()):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            tri = padded[i:i + 3]
+            counts[tri] = counts.get(tri, 0) + 1
+    return counts
+
+
+def _normalize_profile(counts: dict) -> dict:
+    norm = sum(v * v for v in counts.values()) ** 0.5 or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+
+LANGUAGE_PROFILES = {
+    lang: _normalize_profile(_trigram_profile(seed))
+    for lang, seed in LANGUAGE_SEED_TEXTS.items()
+}
+
+
+def detect_language_local(text: str):
+    """
+    Detecta o idioma por similaridade de cosseno entre trigramas de caracteres.
+    Retorna (código, confiança em [0, 1]); ("", 0.0) se não houver letras.
+    Emojis e números são ignorados.
+    """
+    counts = _trigram_profile(text)
+    if not counts:
+        return "", 0.0
+
+    profile = _normalize_profile(counts)
+    scores = sorted(
+        (
+            (sum(w * ref.get(tri, 0.0) for tri, w in profile.items()), lang)
+            for lang, ref in LANGUAGE_PROFILES.items()
+        ),
+        reverse=True,
+    )
+    (best, lang), (second, _) = scores[0], scores[1]
+    if best < LANG_MIN_SIMILARITY:
+        return "", 0.0
+
+    # Margem relativa entre os dois melhores, atenuada para textos curtos
+    margin = (best - second) / best
+    length_factor = min(1.0, sum(counts.values()) / 30)
+    return lang, round(min(1.0, margin * 2) * length_factor, 4)
+
+
+def resolve_local_language(text: str, threshold: float = LANG_CONFIDENCE_THRESHOLD):
+    """Retorna o idioma detectado localmente, ou None se a confiança for baixa."""
+    lang, confidence = detect_language_local(text)
+    return lang if lang and confidence >= threshold else None
+
+
+def merge_language(llm_lang, text: str):
+    """
+    Idioma final de um comentário: a resposta do LLM prevalece quando é um
+    código válido; a detecção local só preenche respostas ausentes ou inválidas.
+    """
+    if llm_lang in ISO_639_1_CODES:
+        return llm_lang
+    return resolve_local_language(text) or llm_lang
+
+
 # ============================================================
 # PROMPTS — Funções de PLN
 # ============================================================
 
-def build_chains(llm_model):
+# Rótulos permitidos (os mesmos listados nos prompts)
+SENTIMENT_LABELS = ("positivo", "negativo", "neutro")
+EMOTION_LABELS = (
+    "alegria", "amor", "nostalgia", "saudade", "tristeza", "melancolia",
+    "raiva", "surpresa", "inspiração", "reflexão", "neutro",
+)
+CONTEXT_LABELS = ("sobre_a_musica", "experiencia_pessoal", "trecho_de_letra", "off_topic")
+
+@functools.lru_cache(maxsize=None)
+def build_prompts():
+    from langchain_core.prompts import PromptTemplate
 
     # Sentimento
     sentiment_prompt = PromptTemplate(
@@ -278,6 +525,28 @@ def build_chains(llm_model):
         """
     )
 
+    # Redução dos resumos parciais (resumo hierárquico)
+    summary_reduce_prompt = PromptTemplate(
+        input_variables=["text"],
+        template="""
+            Abaixo estão resumos parciais, cada um cobrindo um bloco diferente de
+            comentários de YouTube sobre a mesma música.
+
+            Combine-os em uma síntese única, preservando:
+            - as opiniões e percepções predominantes sobre a música, letra, melodia e artista;
+            - as emoções e padrões emocionais recorrentes;
+            - a tendência geral de sentimento;
+            - os temas centrais e contrastes relevantes entre grupos de comentários.
+
+            Dê mais peso ao que aparece em vários resumos; não repita informações.
+
+            Resumos parciais:
+            {text}
+
+            Retorne UM ÚNICO parágrafo de até 10 linhas, sem listas e evitando repetições.
+        """
+    )
+
     # Classificação do contexto (tipo de relação com a música)
     context_prompt = PromptTemplate(
         input_variables=["text"],
@@ -413,270 +682,3615 @@ def build_chains(llm_model):
         """
     )
 
+    # Análise fusionada (todos os campos em um único JSON)
+    fused_prompt = PromptTemplate(
+        input_variables=["text"],
+        template="""
+            Analise o comentário de YouTube abaixo, que trata de uma música,
+            e retorne TODAS as informações em um único objeto JSON.
+
+            Campos obrigatórios:
+            - "language": código ISO-639-1 do idioma predominante (pt, en, es, fr, ...)
+            - "translated": o comentário traduzido para o português brasileiro,
+              preservando gírias, nomes próprios, termos musicais e trechos de letra;
+              se o idioma for "pt", use null (NÃO repita o texto)
+            - "sentiment": uma de: positivo, negativo, neutro
+            - "emotion": uma de: alegria, amor, nostalgia, saudade, tristeza, melancolia,
+              raiva, surpresa, inspiração, reflexão, neutro
+            - "keywords": lista com 5 a 10 palavras-chave significativas
+              (uma palavra cada, no singular, sem artigos, emojis ou números)
+            - "context": uma de: sobre_a_musica, experiencia_pessoal, trecho_de_letra, off_topic
+
+            Comentário:
+            {text}
+
+            Responda SOMENTE com o JSON, sem markdown e sem texto extra.
+        """
+    )
+
+    # Análise fusionada em lote (vários comentários por requisição)
+    batch_prompt = PromptTemplate(
+        input_variables=["comments"],
+        template="""
+            Você receberá uma lista JSON de comentários de YouTube sobre uma música,
+            cada um com "comment_id" e "text".
+
+            Para CADA comentário, produza um objeto com os campos:
+            - "comment_id": o mesmo id recebido
+            - "language": código ISO-639-1 do idioma predominante (pt, en, es, fr, ...)
+            - "translated": o comentário traduzido para o português brasileiro,
+              preservando gírias, nomes próprios, termos musicais e trechos de letra;
+              se o idioma for "pt", use null (NÃO repita o texto)
+            - "sentiment": uma de: positivo, negativo, neutro
+            - "emotion": uma de: alegria, amor, nostalgia, saudade, tristeza, melancolia,
+              raiva, surpresa, inspiração, reflexão, neutro
+            - "keywords": lista com 5 a 10 palavras-chave significativas
+              (uma palavra cada, no singular, sem artigos, emojis ou números)
+            - "context": uma de: sobre_a_musica, experiencia_pessoal, trecho_de_letra, off_topic
+
+            Comentários:
+            {comments}
+
+            Responda SOMENTE com uma lista JSON (um objeto por comentário),
+            sem markdown e sem texto extra.
+        """
+    )
+
+    # Re-pergunta curta quando a resposta de uma chain de classificação não vira rótulo
+    label_retry_prompt = PromptTemplate(
+        input_variables=["text", "task", "labels"],
+        template="""
+            Classifique {task} do comentário abaixo.
+            Responda EXATAMENTE com um destes rótulos: {labels}
+
+            Comentário:
+            {text}
+
+            Resposta (somente o rótulo, sem pontuação):
+        """
+    )
+
+    return {
+        "analysis": fused_prompt,
+        "analysis_batch": batch_prompt,
+        "sentiment": sentiment_prompt,
+        "emotion": emotion_prompt,
+        "keywords": keywords_prompt,
+        "summary": summary_prompt,
+        "summary_reduce": summary_reduce_prompt,
+        "context": context_prompt,
+        "language": language_prompt,
+        "translate": translate_prompt,
+        "label_retry": label_retry_prompt,
+    }
+
+
+# Chains que respondem só um rótulo: saída limitada a poucos tokens
+LABEL_CHAINS = ("sentiment", "emotion", "context", "label_retry")
+LABEL_MAX_TOKENS = 8  # None desativa o limite
+
+
+def build_chains(llm_model):
+    from langchain_core.output_parsers import StrOutputParser
+
+    parser = StrOutputParser()
+    label_model = llm_model.bind(max_tokens=LABEL_MAX_TOKENS) if LABEL_MAX_TOKENS else llm_model
     return {
-        "sentiment": sentiment_prompt | llm_model | parser,
-        "emotion": emotion_prompt | llm_model | parser,
-        "keywords": keywords_prompt | llm_model | parser,
-        "summary": summary_prompt | llm_model | parser,
-        "context": context_prompt | llm_model | parser,
-        "language": language_prompt | llm_model | parser,
-        "translate": translate_prompt | llm_model | parser,
+        name: prompt | (label_model if name in LABEL_CHAINS else llm_model) | parser
+        for name, prompt in build_prompts().items()
     }
 
-LLM_MODEL = get_llm(provider="openai")
-CHAINS = build_chains(LLM_MODEL)
+
+LLM_PROVIDER = "openai"
+
+_PROVIDER_CHAINS = {}
+_PROVIDER_LOCK = threading.Lock()
+
+
+def get_chains(provider: str = None, model: str = None) -> dict:
+    """Chains de um provedor/modelo, construídas no primeiro uso e memoizadas."""
+    provider = provider or LLM_PROVIDER
+    key = (provider, model or LLM_MODELS.get(provider))
+    with _PROVIDER_LOCK:
+        if key not in _PROVIDER_CHAINS:
+            _PROVIDER_CHAINS[key] = build_chains(get_llm(provider, model))
+        return _PROVIDER_CHAINS[key]
 
 
 # ============================================================
-# COLETA DE COMENTÁRIOS DO YOUTUBE
+# LIMITE DE TAXA COMPARTILHADO (token bucket por provedor)
 # ============================================================
 
-def extract_youtube_comments(
-    video_id: str, 
-    max_comments: int = 50, 
-    order: str = "relevance"
-):
+# Limites globais, compartilhados por todos os vídeos processados em paralelo
+RATE_LIMITS = {
+    "youtube": {"rpm": 600},
+    "openai": {"rpm": 500, "tpm": 200_000},
+    "groq": {"rpm": 30, "tpm": 6_000},
+}
 
-    youtube = build("youtube", "v3", developerKey=os.getenv("YOUTUBE_API_KEY"))
-    comments = []
 
-    request = youtube.commentThreads().list(
-        part="snippet",
-        videoId=video_id,
-        textFormat="plainText",
-        maxResults=100,
-        order=order  
-    )
+class TokenBucket:
+    """Token bucket thread-safe; `acquire` bloqueia e `aacquire` aguarda sem travar o loop."""
 
-    response = request.execute()
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
 
-    while response and len(comments) < max_comments:
+    def _reserve(self, n: float) -> float:
+        # Reserva `n` fichas e devolve quanto tempo esperar até que existam
+        n = min(n, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
 
-        for item in response.get("items", []):
-            snippet = item["snippet"]["topLevelComment"]["snippet"]
-            comments.append({
-                "comment_id": item["snippet"]["topLevelComment"]["id"],
-                "author": snippet.get("authorDisplayName"),
-                "text": snippet.get("textDisplay", ""),
-                "published_at": snippet.get("publishedAt"),
-                "like_count": snippet.get("likeCount", 0),
-                "comment_url": (
-                    f"https://www.youtube.com/watch?v={video_id}&lc="
-                    f"{item['snippet']['topLevelComment']['id']}"
-                ),
-                "video_id": video_id,
-            })
+    def estimated_wait(self, n: float = 1) -> float:
+        """Espera prevista para `n` fichas, sem reservá-las."""
+        with self._lock:
+            available = min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+        missing = min(n, self.capacity) - available
+        return 0.0 if missing <= 0 else missing / self.rate
 
-            if len(comments) >= max_comments:
-                break
+    def acquire(self, n: float = 1):
+        wait = self._reserve(n)
+        if wait > 0:
+            time.sleep(wait)
 
-        if "nextPageToken" not in response:
-            break
+    async def aacquire(self, n: float = 1):
+        wait = self._reserve(n)
+        if wait > 0:
+            await asyncio.sleep(wait)
 
-        response = youtube.commentThreads().list(
-            part="snippet",
-            videoId=video_id,
-            textFormat="plainText",
-            maxResults=100,
-            pageToken=response["nextPageToken"],
-            order=order
-        ).execute()
 
-    return comments, order
+class ProviderLimiter:
+    """Requisições por minuto (rpm) e, opcionalmente, tokens por minuto (tpm)."""
 
-# ============================================================
-# PROCESSAMENTO INDIVIDUAL
-# ============================================================
+    def __init__(self, rpm=None, tpm=None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
 
-def process_comment(text: str):
+    def acquire(self, tokens: int = 0):
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens and tokens:
+            self.tokens.acquire(tokens)
 
-    text_expanded = emoji_to_text(text)
+    async def aacquire(self, tokens: int = 0):
+        if self.requests:
+            await self.requests.aacquire(1)
+        if self.tokens and tokens:
+            await self.tokens.aacquire(tokens)
 
-    # 1) Detectar idioma
-    lang = CHAINS["language"].invoke({"text": text_expanded}).strip().lower()
+    def estimated_wait(self, tokens: int = 0) -> float:
+        waits = [0.0]
+        if self.requests:
+            waits.append(self.requests.estimated_wait(1))
+        if self.tokens and tokens:
+            waits.append(self.tokens.estimated_wait(tokens))
+        return max(waits)
 
-    # 2) Traduzir caso não seja PT
-    translated = CHAINS["translate"].invoke({
-        "text": text_expanded,
-        "lang": lang
-    }).strip()
 
-    return {
-        "emoji_expanded": text_expanded,
-        "language": lang,
-        "translated": translated,
-        "sentiment": CHAINS["sentiment"].invoke({"text": translated}).strip().lower(),
-        "emotion": CHAINS["emotion"].invoke({"text": translated}).strip().lower(),
-        "keywords": CHAINS["keywords"].invoke({"text": translated}).strip(),
-        "context": CHAINS["context"].invoke({"text": translated}).strip().lower()
-    }
+RATE_LIMITERS = {name: ProviderLimiter(**limits) for name, limits in RATE_LIMITS.items()}
+
+
+def get_rate_limiter(provider: str) -> ProviderLimiter:
+    if provider not in RATE_LIMITERS:
+        RATE_LIMITERS[provider] = ProviderLimiter(**RATE_LIMITS.get(provider, {}))
+    return RATE_LIMITERS[provider]
 
 
 # ============================================================
-# ANÁLISE COMPLETA COM LOGS
+# CACHE PERSISTENTE DE RESULTADOS DO LLM (SQLite)
 # ============================================================
 
-def analyze_comments(comments):
-    enriched_data = []
+LLM_CACHE_PATH = "youtube_comments/.cache/llm_cache.sqlite"
+LLM_CACHE_MAX_ENTRIES = 500_000
+LLM_CACHE_MAX_AGE_DAYS = 90
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
 
-    print("\n=== INICIANDO ANÁLISE DOS COMENTÁRIOS ===\n")
 
-    for idx, c in enumerate(comments, start=1):
+LLM_CACHE_TOUCH_BATCH = 500    # hits acumulados antes de gravar os last_used
 
-        # NOVO: proteção contra formatos inválidos
-        if not isinstance(c, dict) or "text" not in c:
-            print(f"⚠ Comentário ignorado (formato inesperado): {c}")
-            continue
 
-        processed = process_comment(c["text"])
-        enriched = {**c, **processed}
-        enriched_data.append(enriched)
+class LLMCache:
+    """
+    Cache em disco endereçado por conteúdo:
+    chave = sha256(chain, template do prompt, modelo, temperatura, entrada).
+    Evicção por idade e por quantidade (remove os menos usados).
+    """
 
-        print(f"[{idx}/{len(comments)}] Comentário analisado:")
-        print(f"Texto: {c['text'][:90]}")
-        print(f"Sentimento: {processed['sentiment']} | Emoção: {processed['emotion']} | Contexto: {processed['context']}")
-        print("-" * 70)
+    def __init__(self, path, max_entries=LLM_CACHE_MAX_ENTRIES, max_age_days=LLM_CACHE_MAX_AGE_DAYS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._touched = {}         # key → last_used pendente (gravado em lote)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, chain TEXT, value TEXT,"
+            " created_at REAL, last_used REAL)"
+        )
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(chain, template, model, temperature, inputs) -> str:
+        raw = json.dumps(
+            [chain, template, model, temperature, inputs],
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # last_used só orienta a evicção: acumula e grava em lote
+            self._touched[key] = time.time()
+            if len(self._touched) >= LLM_CACHE_TOUCH_BATCH:
+                self._flush_touched()
+                self._conn.commit()
+            return row[0]
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE llm_cache SET last_used = ? WHERE key = ?",
+                [(t, k) for k, t in self._touched.items()]
+            )
+            self._touched = {}
+
+    def flush(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+
+    def set(self, key, chain, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                (key, chain, value, now, now)
+            )
+            self._touched.pop(key, None)
+            self._flush_touched()
+            self._conn.commit()
+            self._writes += 1
+        if self._writes % 1000 == 0:
+            self.evict()
+
+    def evict(self):
+        with self._lock:
+            self._flush_touched()
+            cutoff = time.time() - self.max_age_days * 86400
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (cutoff,))
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
 
-    print("\n=== ANÁLISE COMPLETA ===\n")
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
 
-    return enriched_data
 
-# ============================================================
-# RESUMO FINAL
-# ============================================================
+_LLM_CACHE = None
+_LLM_CACHE_LOCK = threading.Lock()
 
-def generate_final_summary(analyzed_comments):
-    combined = "\n".join([c["translated"] for c in analyzed_comments])
-    return CHAINS["summary"].invoke({"text": combined}).strip()
 
-# ============================================================
-# ESTATÍSTICAS
-# ============================================================
+def get_llm_cache():
+    """Cache aberto no primeiro uso (None se desativado por LLM_CACHE_BYPASS)."""
+    global _LLM_CACHE
+    if LLM_CACHE_BYPASS:
+        return None
+    with _LLM_CACHE_LOCK:
+        if _LLM_CACHE is None:
+            _LLM_CACHE = LLMCache(LLM_CACHE_PATH)
+        return _LLM_CACHE
 
-def generate_stats(analyzed_comments):
+_CHAIN_FINGERPRINTS = {}
 
-    df = pd.DataFrame(analyzed_comments)
 
-    stats = {
-        "sentiment_counts": df["sentiment"].value_counts().to_dict() if "sentiment" in df else {},
-        "emotion_counts": df["emotion"].value_counts().to_dict() if "emotion" in df else {},
-        "context_counts": df["context"].value_counts().to_dict() if "context" in df else {},
-        "language_counts": df["language"].value_counts().to_dict() if "language" in df else {}
-    }
+def _chain_fingerprint(name: str, provider: str = None):
+    """
+    (template, modelo, temperatura) de uma chain, para compor a chave do cache.
+    O modelo é o do `provider` (por padrão, o primário, usado nas consultas).
+    """
+    provider = provider or LLM_PROVIDER
+    if (name, provider) not in _CHAIN_FINGERPRINTS:
+        # Vem da configuração: consultar o cache não exige construir o cliente
+        template = build_prompts()[name].template
+        model = LLM_MODELS.get(provider)
+        if name in LABEL_CHAINS and LABEL_MAX_TOKENS:
+            model = f"{model}|max_tokens={LABEL_MAX_TOKENS}"
+        _CHAIN_FINGERPRINTS[(name, provider)] = (template, model, LLM_TEMPERATURE)
+    return _CHAIN_FINGERPRINTS[(name, provider)]
 
-    # retorna somente o dicionário de stats (não grava nada no diretório raiz)
-    return stats
+
+def _cache_key(name: str, inputs: dict, bypass: bool, provider: str = None):
+    if bypass or get_llm_cache() is None:
+        return None
+    return LLMCache.make_key(name, *_chain_fingerprint(name, provider), inputs)
 
 
 # ============================================================
-# SALVAMENTO
+# INSTRUMENTAÇÃO (latência, tokens, custo, etapas)
 # ============================================================
 
-def save_json(filename, data):
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-
-def save_outputs_for_video(video_id, comments, analyzed, resumo, stats):
-    base_dir = f"youtube_comments/{video_id}"
-    os.makedirs(base_dir, exist_ok=True)
+METRICS_ENABLED = True
+METRICS_DIR = "youtube_comments/.metrics"
+TRACE_PATH = f"{METRICS_DIR}/traces.jsonl"          # um evento JSON por chamada/etapa
+METRICS_PATH = f"{METRICS_DIR}/metrics.prom"        # formato texto do Prometheus
+TRACE_FLUSH_EVENTS = 200
 
-    # Arquivos JSON essenciais
-    save_json(f"{base_dir}/comentarios_youtube_{video_id}.json", comments)
-    save_json(f"{base_dir}/comentarios_analisados_{video_id}.json", analyzed)
+# US$ por 1M de tokens (entrada, saída) — estimativa de custo por modelo
+LLM_PRICES = {
+    "gpt-4.1-mini": (0.40, 1.60),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+}
 
-    # Estatísticas (mantém JSON)
-    with open(f"{base_dir}/stats_resumo_{video_id}.json", "w", encoding="utf-8") as f:
-        json.dump(stats, f, indent=4, ensure_ascii=False)
+# Vídeo em processamento (herdado pelas tarefas assíncronas da análise)
+_TRACE_VIDEO = contextvars.ContextVar("trace_video", default=None)
 
 
-def generate_pdf_report(video_id, resumo, stats, analyzed, order_used):
-    base_dir = f"youtube_comments/{video_id}"
-    os.makedirs(base_dir, exist_ok=True)
+def percentile(values, q: float) -> float:
+    """Percentil por posição mais próxima (q entre 0 e 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
 
-    file_path = f"{base_dir}/relatorio_{video_id}.pdf"
 
-    # Document settings
-    doc = SimpleDocTemplate(
-        file_path,
-        pagesize=A4,
-        title=f"Relatório de Análise - {video_id}",
-        leftMargin=40,
-        rightMargin=40,
-        topMargin=40,
-        bottomMargin=40,
-    )
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price_in, price_out = LLM_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
 
-    styles = getSampleStyleSheet()
-    story = []
 
-    # =============================
-    # THUMBNAIL DO VÍDEO
-    # =============================
-    story.append(Paragraph("<b>Capa do Vídeo</b>", styles["Heading2"]))
-    story.append(Spacer(1, 6))
+class Metrics:
+    """
+    Coletor de métricas do processo: chamadas às chains (latência, tokens,
+    retentativas, cache) e duração das etapas de cada vídeo. Os eventos vão
+    para um JSONL de traces; `write_prometheus` e `print_summary` agregam.
+    """
 
-    thumb_path = f"{base_dir}/thumbnail_{video_id}.jpg"
-    thumb_urls = [
-        f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",
-        f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
-    ]
+    def __init__(self, trace_path=TRACE_PATH):
+        self.trace_path = trace_path
+        self.calls = {}      # (chain, provider, model, cache) → agregados
+        self.stages = {}     # etapa → lista de durações
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def _emit(self, event: dict):
+        event = {"ts": round(time.time(), 3), "video_id": _TRACE_VIDEO.get(), **event}
+        self._buffer.append(event)
+        if len(self._buffer) >= TRACE_FLUSH_EVENTS:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        os.makedirs(os.path.dirname(self.trace_path) or ".", exist_ok=True)
+        append_jsonl(self.trace_path, self._buffer)
+        self._buffer = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def record_llm(self, chain, provider=None, model=None, latency=0.0, prompt_tokens=0,
+                   completion_tokens=0, retries=0, cache_hit=False, error=None):
+        # Falhas não entram na latência nem no custo: só na contagem de erros e no evento
+        cost = 0.0 if cache_hit or error is not None else estimate_cost(model, prompt_tokens, completion_tokens)
+        key = (chain, provider or "-", model or "-", "hit" if cache_hit else "miss")
+        with self._lock:
+            agg = self.calls.setdefault(key, {
+                "latencies": [], "prompt_tokens": 0, "completion_tokens": 0,
+                "retries": 0, "errors": 0, "cost": 0.0,
+            })
+            if error is None:
+                agg["latencies"].append(latency)
+                agg["prompt_tokens"] += prompt_tokens
+                agg["completion_tokens"] += completion_tokens
+            agg["retries"] += retries
+            agg["errors"] += error is not None
+            agg["cost"] += cost
+            self._emit({
+                "type": "llm", "chain": chain, "provider": provider, "model": model,
+                "latency_s": round(latency, 4), "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens, "retries": retries,
+                "cache_hit": cache_hit, "cost_usd": round(cost, 8), "error": error,
+            })
 
-    downloaded = False
-    for url in thumb_urls:
-        try:
-            r = requests.get(url, timeout=10)
-            if r.status_code == 200 and len(r.content) > 1000:
-                with open(thumb_path, "wb") as img:
-                    img.write(r.content)
-                downloaded = True
-                break
-        except:
-            pass
+    def record_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages.setdefault(stage, []).append(seconds)
+            self._emit({"type": "stage", "stage": stage, "seconds": round(seconds, 4)})
 
-    if downloaded:
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
         try:
-            img = Image(thumb_path)
-            img._restrictSize(450, 250)
-            story.append(img)
-            story.append(Spacer(1, 20))
-        except Exception as e:
-            print(f"⚠ Erro ao inserir thumbnail no PDF: {e}")
-    else:
-        story.append(Paragraph("<i>Thumbnail não disponível</i>", styles["BodyText"]))
-        story.append(Spacer(1, 20))
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def write_prometheus(self, path=METRICS_PATH):
+        def labels(**kv):
+            return "{" + ",".join(f'{k}="{v}"' for k, v in kv.items()) + "}"
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{lbl} {value:g}" for lbl, value in samples)
+
+        with self._lock:
+            calls = {k: dict(v, latencies=list(v["latencies"])) for k, v in self.calls.items()}
+            stages = {k: list(v) for k, v in self.stages.items()}
+
+        ids = {key: dict(chain=key[0], provider=key[1], model=key[2], cache=key[3]) for key in calls}
+        metric("yt_llm_calls_total", "counter", "Chamadas às chains do LLM",
+               [(labels(**ids[k]), len(v["latencies"]) + v["errors"]) for k, v in calls.items()])
+        metric("yt_llm_tokens_total", "counter", "Tokens de entrada/saída",
+               [(labels(**ids[k], kind=kind), v[f"{kind}_tokens"]) for k, v in calls.items()
+                for kind in ("prompt", "completion")])
+        metric("yt_llm_retries_total", "counter", "Retentativas após erro retentável",
+               [(labels(**ids[k]), v["retries"]) for k, v in calls.items()])
+        metric("yt_llm_errors_total", "counter", "Chamadas que falharam após as retentativas",
+               [(labels(**ids[k]), v["errors"]) for k, v in calls.items()])
+        metric("yt_llm_cost_usd_total", "counter", "Custo estimado em US$",
+               [(labels(**ids[k]), v["cost"]) for k, v in calls.items()])
+
+        for name, help_text, groups in (
+            ("yt_llm_latency_seconds", "Latência das chamadas às chains", {
+                labels(**ids[k])[1:-1]: v["latencies"] for k, v in calls.items()
+            }),
+            ("yt_stage_seconds", "Duração das etapas por vídeo", {
+                labels(stage=k)[1:-1]: v for k, v in stages.items()
+            }),
+        ):
+            samples = []
+            for base, values in groups.items():
+                for q in (0.5, 0.95, 0.99):
+                    samples.append((f"{{{base},quantile=\"{q}\"}}", percentile(values, q * 100)))
+            metric(name, "summary", help_text, samples)
+            lines.extend(f"{name}_sum{{{base}}} {sum(values):g}" for base, values in groups.items())
+            lines.extend(f"{name}_count{{{base}}} {len(values)}" for base, values in groups.items())
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+        return path
+
+    def print_summary(self):
+        with self._lock:
+            calls = {k: dict(v, latencies=list(v["latencies"])) for k, v in self.calls.items()}
+            stages = {k: list(v) for k, v in self.stages.items()}
+
+        by_chain = {}
+        for (chain, provider, model, cache), v in calls.items():
+            row = by_chain.setdefault(chain, {"latencies": [], "hits": 0, "tokens": 0, "retries": 0, "cost": 0.0})
+            if cache == "hit":
+                row["hits"] += len(v["latencies"])
+            else:
+                row["latencies"].extend(v["latencies"])
+            row["tokens"] += v["prompt_tokens"] + v["completion_tokens"]
+            row["retries"] += v["retries"]
+            row["cost"] += v["cost"]
+
+        print("\n=== MÉTRICAS DAS CHAINS (latência em s, chamadas ao LLM) ===")
+        print(f"{'chain':<15} {'chamadas':>8} {'cache':>6} {'p50':>7} {'p95':>7} {'p99':>7} "
+              f"{'tokens':>9} {'retries':>7} {'custo US$':>10}")
+        for chain, row in sorted(by_chain.items(), key=lambda kv: -kv[1]["cost"]):
+            lat = row["latencies"]
+            print(f"{chain:<15} {len(lat):>8} {row['hits']:>6} {percentile(lat, 50):>7.2f} "
+                  f"{percentile(lat, 95):>7.2f} {percentile(lat, 99):>7.2f} {row['tokens']:>9} "
+                  f"{row['retries']:>7} {row['cost']:>10.4f}")
+
+        by_model = Counter()
+        for (_, provider, model, cache), v in calls.items():
+            if cache == "miss":
+                by_model[f"{provider}/{model}"] += v["cost"]
+        if by_model:
+            print("Custo estimado por provedor/modelo: " + ", ".join(f"{k} US$ {v:.4f}" for k, v in by_model.items()))
+
+        if stages:
+            print("\n=== ETAPAS (s por vídeo) ===")
+            print(f"{'etapa':<10} {'n':>4} {'p50':>8} {'p95':>8} {'p99':>8} {'total':>9}")
+            for name, values in stages.items():
+                print(f"{name:<10} {len(values):>4} {percentile(values, 50):>8.2f} {percentile(values, 95):>8.2f} "
+                      f"{percentile(values, 99):>8.2f} {sum(values):>9.2f}")
+        print()
+
+
+METRICS = Metrics()
+
+
+def stage_timer(name: str):
+    """`with stage_timer("fetch"): ...` — registra a duração da etapa (se ativado)."""
+    return METRICS.stage(name) if METRICS_ENABLED else contextlib.nullcontext()
+
+
+def _usage_handler():
+    """Callback que coleta os tokens reais informados pelo provedor (se disponível)."""
+    if not METRICS_ENABLED:
+        return None
+    try:
+        from langchain_core.callbacks import UsageMetadataCallbackHandler
+    except ImportError:
+        return None
+    return UsageMetadataCallbackHandler()
+
+
+def _chain_config(handler):
+    return {"callbacks": [handler]} if handler is not None else None
+
+
+def _record_call(name, provider, inputs, output, latency, retries, handler, error=None):
+    if not METRICS_ENABLED:
+        return
+    usage = getattr(handler, "usage_metadata", None) or {}
+    prompt_tokens = sum(u.get("input_tokens", 0) for u in usage.values())
+    completion_tokens = sum(u.get("output_tokens", 0) for u in usage.values())
+    if not usage and error is None:
+        prompt_tokens = _estimate_prompt_tokens(name, inputs)
+        completion_tokens = estimate_tokens(output) if output else 0
+    METRICS.record_llm(
+        name, provider, LLM_MODELS.get(provider), latency,
+        prompt_tokens, completion_tokens, retries, error=error,
+    )
 
-    # =============================
-    # TÍTULO + LINK + ORDEM
-    # =============================
-    story.append(Paragraph(
-        f"<b>Relatório de Análise de Comentários – Vídeo {video_id}</b>",
-        styles["Title"]
-    ))
-    story.append(Spacer(1, 12))
 
-    video_url = f"https://www.youtube.com/watch?v={video_id}"
-    story.append(Paragraph(f'<a href="{video_url}">{video_url}</a>', styles["BodyText"]))
-    story.append(Spacer(1, 10))
+# ============================================================
+# RETRY E FAILOVER ENTRE PROVEDORES DE LLM
+# ============================================================
 
-    story.append(Paragraph(
-        f"<i>Ordem de coleta dos comentários: <b>{order_used}</b></i>",
-        styles["BodyText"]
-    ))
-    story.append(Spacer(1, 20))
+# Ordem de preferência; só entram provedores com chave de API configurada
+LLM_FAILOVER_PROVIDERS = ["openai", "groq"]
+LLM_MAX_RETRIES = 6
+LLM_BACKOFF_BASE = 1.0         # segundos
+LLM_BACKOFF_MAX = 60.0
+LLM_FAILOVER_WAIT = 2.0        # espera prevista (s) a partir da qual o provedor é "saturado"
 
-    # =============================
-    # RESUMO FINAL
-    # =============================
-    story.append(Paragraph("<b>Resumo Geral</b>", styles["Heading2"]))
-    story.append(Spacer(1, 6))
-    story.append(Paragraph(resumo, styles["BodyText"]))
-    story.append(Spacer(1, 20))
+_PROVIDER_KEYS = {"openai": "OPENAI_API_KEY", "groq": "GROQ_API_KEY"}
 
-    # =============================
-    # ESTATÍSTICAS
-    # =============================
-    story.append(Paragraph("<b>Estatísticas de Comentários</b>", styles["Heading2"]))
-    story.append(Spacer(1, 6))
+
+class ProviderState:
+    """
+    Saúde de um provedor: cooldown após 429/5xx. O uso por minuto (rpm/tpm)
+    fica no `ProviderLimiter`, que é o que `pick_provider` consulta.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.cooldown_until = 0.0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+
+    def record_failure(self, retry_after=None) -> float:
+        """Aplica backoff exponencial com jitter e devolve a duração do cooldown."""
+        with self._lock:
+            self.failures += 1
+            delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** (self.failures - 1))
+            delay *= 0.5 + random.random()
+            if retry_after:
+                delay = max(delay, retry_after)
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + delay)
+            return delay
+
+    def cooldown_remaining(self) -> float:
+        return max(0.0, self.cooldown_until - time.monotonic())
+
+
+PROVIDER_STATES = {}
+
+
+def available_providers() -> list:
+    providers = [p for p in LLM_FAILOVER_PROVIDERS if os.getenv(_PROVIDER_KEYS.get(p, ""), "")]
+    if LLM_PROVIDER in providers:
+        providers.remove(LLM_PROVIDER)
+    return [LLM_PROVIDER] + providers
+
+
+def _provider_state(provider: str) -> ProviderState:
+    if provider not in PROVIDER_STATES:
+        PROVIDER_STATES[provider] = ProviderState(provider)
+    return PROVIDER_STATES[provider]
+
+
+def pick_provider(tokens: int):
+    """
+    Primeiro provedor (em ordem de preferência) cuja espera prevista
+    (cooldown ou fila no rate limiter) fica abaixo de LLM_FAILOVER_WAIT; se
+    todos estiverem saturados, o que libera mais cedo. Retorna (provedor,
+    espera_em_segundos), em que a espera é sempre o cooldown restante do
+    escolhido — a fila do rate limiter já é aguardada no `acquire`.
+    """
+    best = None
+    for provider in available_providers():
+        cooldown = _provider_state(provider).cooldown_remaining()
+        wait = max(cooldown, get_rate_limiter(provider).estimated_wait(tokens))
+        if wait < LLM_FAILOVER_WAIT:
+            return provider, cooldown
+        if best is None or wait < best[2]:
+            best = (provider, cooldown, wait)
+    return best[0], best[1]
+
+
+def classify_llm_error(error: Exception):
+    """
+    Retorna (retentável, retry_after). 429, 5xx, timeouts e falhas de
+    conexão são retentáveis; erros de requisição (4xx) não.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+
+    retry_after = None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        retry_after = None
+
+    if status is not None:
+        return (status == 429 or status >= 500), retry_after
+
+    name = type(error).__name__.lower()
+    retryable = any(k in name for k in ("ratelimit", "timeout", "connection", "overloaded", "unavailable"))
+    return retryable or isinstance(error, (TimeoutError, ConnectionError)), retry_after
+
+
+def _call_with_failover(name: str, inputs: dict):
+    """Retorna (saída, provedor que respondeu)."""
+    tokens = _estimate_prompt_tokens(name, inputs)
+    last_error = None
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        provider, wait = pick_provider(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+        handler = _usage_handler()
+        started = None
+        try:
+            get_rate_limiter(provider).acquire(tokens)
+            started = time.perf_counter()
+            output = get_chains(provider)[name].invoke(inputs, config=_chain_config(handler))
+            _provider_state(provider).record_success()
+            _record_call(name, provider, inputs, output, time.perf_counter() - started, attempt, handler)
+            return output, provider
+        except Exception as e:
+            retryable, retry_after = classify_llm_error(e)
+            if not retryable or attempt == LLM_MAX_RETRIES:
+                elapsed = time.perf_counter() - started if started is not None else 0.0
+                _record_call(name, provider, inputs, None, elapsed, attempt, handler, error=type(e).__name__)
+            if not retryable:
+                raise
+            last_error = e
+            delay = _provider_state(provider).record_failure(retry_after)
+            print(f"⚠ LLM {provider} ({type(e).__name__}) em '{name}', cooldown de {delay:.1f}s")
+
+    raise last_error
+
+
+async def _acall_with_failover(name: str, inputs: dict):
+    """Retorna (saída, provedor que respondeu)."""
+    tokens = _estimate_prompt_tokens(name, inputs)
+    sem = _INFLIGHT.get()
+    last_error = None
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        provider, wait = pick_provider(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        handler = _usage_handler()
+        started = None
+        try:
+            await get_rate_limiter(provider).aacquire(tokens)
+            chain = get_chains(provider)[name]
+            if sem is None:
+                started = time.perf_counter()
+                output = await chain.ainvoke(inputs, config=_chain_config(handler))
+            else:
+                async with sem:
+                    started = time.perf_counter()
+                    output = await chain.ainvoke(inputs, config=_chain_config(handler))
+            _provider_state(provider).record_success()
+            _record_call(name, provider, inputs, output, time.perf_counter() - started, attempt, handler)
+            return output, provider
+        except Exception as e:
+            retryable, retry_after = classify_llm_error(e)
+            if not retryable or attempt == LLM_MAX_RETRIES:
+                elapsed = time.perf_counter() - started if started is not None else 0.0
+                _record_call(name, provider, inputs, None, elapsed, attempt, handler, error=type(e).__name__)
+            if not retryable:
+                raise
+            last_error = e
+            delay = _provider_state(provider).record_failure(retry_after)
+            print(f"⚠ LLM {provider} ({type(e).__name__}) em '{name}', cooldown de {delay:.1f}s")
+
+    raise last_error
+
+
+# ============================================================
+# INVOCAÇÃO DAS CHAINS (ponto único, síncrono e assíncrono)
+# ============================================================
+
+# Semáforo do motor assíncrono: limita as requisições simultâneas ao LLM
+_INFLIGHT = contextvars.ContextVar("inflight_semaphore", default=None)
+
+
+def _estimate_prompt_tokens(name: str, inputs: dict) -> int:
+    template = build_prompts()[name].template
+    return estimate_tokens(template) + sum(estimate_tokens(str(v)) for v in inputs.values())
+
+
+def _invoke(name: str, inputs: dict, bypass_cache: bool = False):
+    """Retorna (saída, provedor que respondeu); provedor None se veio do cache."""
+    key = _cache_key(name, inputs, bypass_cache)
+    if key is not None:
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            if METRICS_ENABLED:
+                METRICS.record_llm(name, cache_hit=True)
+            return cached, None
+
+    output, provider = _call_with_failover(name, inputs)
+
+    # Guardada sob o modelo que respondeu: respostas de failover não se passam pelo primário
+    if key is not None and output.strip():
+        get_llm_cache().set(_cache_key(name, inputs, bypass_cache, provider), name, output)
+    return output, provider
+
+
+def invoke_chain(name: str, inputs: dict, bypass_cache: bool = False) -> str:
+    return (_invoke(name, inputs, bypass_cache))[0]
+
+
+async def _ainvoke(name: str, inputs: dict, bypass_cache: bool = False):
+    """Retorna (saída, provedor que respondeu); provedor None se veio do cache."""
+    key = _cache_key(name, inputs, bypass_cache)
+    if key is not None:
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            if METRICS_ENABLED:
+                METRICS.record_llm(name, cache_hit=True)
+            return cached, None
+
+    output, provider = await _acall_with_failover(name, inputs)
+
+    # Guardada sob o modelo que respondeu: respostas de failover não se passam pelo primário
+    if key is not None and output.strip():
+        get_llm_cache().set(_cache_key(name, inputs, bypass_cache, provider), name, output)
+    return output, provider
+
+
+async def ainvoke_chain(name: str, inputs: dict, bypass_cache: bool = False) -> str:
+    return (await _ainvoke(name, inputs, bypass_cache))[0]
+
+
+# ============================================================
+# COLETA DE COMENTÁRIOS DO YOUTUBE
+# ============================================================
+
+YT_MAX_RETRIES = 5
+YT_BACKOFF_BASE = 1.0          # segundos (dobra a cada tentativa, com jitter)
+YT_REPLY_WORKERS = 8           # threads para buscar respostas em paralelo
+YT_INLINE_REPLIES = 5          # commentThreads traz no máximo 5 respostas embutidas
+
+# Partial responses: pede à API apenas os campos usados
+_COMMENT_FIELDS = "id,snippet(authorDisplayName,textDisplay,publishedAt,likeCount,parentId)"
+THREAD_FIELDS = (
+    "nextPageToken,"
+    "items(id,snippet(totalReplyCount,topLevelComment(" + _COMMENT_FIELDS + ")),"
+    "replies(comments(" + _COMMENT_FIELDS + ")))"
+)
+REPLY_FIELDS = "nextPageToken,items(" + _COMMENT_FIELDS + ")"
+
+_YT_LOCAL = threading.local()
+
+
+def _youtube_client():
+    # O cliente HTTP do googleapiclient não é thread-safe: um por thread
+    if not hasattr(_YT_LOCAL, "client"):
+        from googleapiclient.discovery import build
+
+        _YT_LOCAL.client = build("youtube", "v3", developerKey=os.getenv("YOUTUBE_API_KEY"))
+    return _YT_LOCAL.client
+
+
+def _is_retryable(error) -> bool:
+    status = getattr(error.resp, "status", 0)
+    if status == 429 or status >= 500:
+        return True
+    if status == 403:
+        # rateLimitExceeded é transitório; quotaExceeded (cota diária) não
+        content = error.content.decode("utf-8", "ignore") if isinstance(error.content, bytes) else str(error.content)
+        return "rateLimitExceeded" in content or "userRateLimitExceeded" in content
+    return False
+
+
+def execute_with_retry(request, max_retries: int = YT_MAX_RETRIES):
+    """Executa uma requisição da API do YouTube com backoff exponencial + jitter."""
+    from googleapiclient.errors import HttpError
+
+    for attempt in range(max_retries + 1):
+        try:
+            get_rate_limiter("youtube").acquire()
+            return request.execute()
+        except HttpError as e:
+            if attempt == max_retries or not _is_retryable(e):
+                raise
+            reason = f"HTTP {e.resp.status}"
+        except (ConnectionError, TimeoutError, OSError) as e:
+            if attempt == max_retries:
+                raise
+            reason = type(e).__name__
+
+        delay = YT_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+        print(f"⚠ YouTube API ({reason}), nova tentativa em {delay:.1f}s")
+        time.sleep(delay)
+
+
+def _comment_record(video_id: str, comment: dict) -> dict:
+    snippet = comment["snippet"]
+    record = {
+        "comment_id": comment["id"],
+        "author": snippet.get("authorDisplayName"),
+        "text": snippet.get("textDisplay", ""),
+        "published_at": snippet.get("publishedAt"),
+        "like_count": snippet.get("likeCount", 0),
+        "comment_url": f"https://www.youtube.com/watch?v={video_id}&lc={comment['id']}",
+        "video_id": video_id,
+    }
+    if snippet.get("parentId"):
+        record["parent_id"] = snippet["parentId"]
+    return record
+
+
+def fetch_all_replies(video_id: str, thread_id: str) -> list:
+    """Pagina `comments().list` para obter todas as respostas de um thread."""
+    replies = []
+    page_token = None
+
+    while True:
+        response = execute_with_retry(_youtube_client().comments().list(
+            part="snippet",
+            parentId=thread_id,
+            textFormat="plainText",
+            maxResults=100,
+            pageToken=page_token,
+            fields=REPLY_FIELDS,
+        ))
+        replies.extend(_comment_record(video_id, r) for r in response.get("items", []))
+
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return replies
+
+
+def _checkpoint_paths(video_id: str, order: str):
+    base_dir = f"youtube_comments/{video_id}"
+    return (
+        f"{base_dir}/fetch_checkpoint_{video_id}_{order}.json",
+        f"{base_dir}/fetch_parcial_{video_id}_{order}.jsonl",
+    )
+
+
+def iter_youtube_comment_pages(
+    video_id: str,
+    max_comments: int = 50,
+    order: str = "relevance",
+    include_replies: bool = False,
+    resume: bool = True,
+    reply_workers: int = YT_REPLY_WORKERS,
+):
+    """
+    Gera páginas (listas) de comentários à medida que chegam da API.
+    Cada página é gravada em disco junto com o `nextPageToken` antes de ser
+    entregue; se a coleta for interrompida, a próxima execução com
+    `resume=True` reaproveita o que já foi baixado e continua do token salvo.
+    """
+    os.makedirs(f"youtube_comments/{video_id}", exist_ok=True)
+    checkpoint_path, partial_path = _checkpoint_paths(video_id, order)
+
+    collected = 0
+    page_token = None
+    seen = set()
+
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding="utf-8") as f:
+            page_token = json.load(f).get("next_page_token")
+        previous = []
+        if os.path.exists(partial_path):
+            with open(partial_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        c = json.loads(line)
+                        if c["comment_id"] not in seen:
+                            seen.add(c["comment_id"])
+                            previous.append(c)
+            previous = previous[:max_comments]
+        if previous:
+            print(f"↩ Retomando coleta de {video_id}: {len(previous)} comentários já baixados")
+            collected = len(previous)
+            yield previous
+        if page_token is None:
+            collected = max_comments     # coleta anterior já havia terminado
+    else:
+        for path in (checkpoint_path, partial_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    while collected < max_comments:
+        response = execute_with_retry(_youtube_client().commentThreads().list(
+            part="snippet,replies" if include_replies else "snippet",
+            videoId=video_id,
+            textFormat="plainText",
+            maxResults=max(1, min(100, max_comments - collected)),
+            pageToken=page_token,
+            order=order,
+            fields=THREAD_FIELDS,
+        ))
+
+        page = []
+        threads_to_expand = []
+
+        for item in response.get("items", []):
+            page.append(_comment_record(video_id, item["snippet"]["topLevelComment"]))
+
+            if include_replies:
+                inline = item.get("replies", {}).get("comments", [])
+                total = item["snippet"].get("totalReplyCount", 0)
+                # Respostas embutidas são no máximo YT_INLINE_REPLIES, mas podem vir
+                # menos que o total mesmo abaixo desse limite
+                if total > len(inline):
+                    threads_to_expand.append((len(page), item["id"]))
+                else:
+                    page.extend(_comment_record(video_id, r) for r in inline)
+
+        # Threads com respostas faltando: busca completa em paralelo
+        if threads_to_expand:
+            with ThreadPoolExecutor(max_workers=reply_workers) as pool:
+                fetched = list(pool.map(
+                    lambda t: fetch_all_replies(video_id, t[1]),
+                    threads_to_expand
+                ))
+            # insere as respostas logo após o respectivo comentário principal
+            for (pos, _), replies in sorted(zip(threads_to_expand, fetched), reverse=True):
+                page[pos:pos] = replies
+
+        # Uma página pode se repetir se a execução anterior caiu entre as gravações
+        page = [c for c in page if c["comment_id"] not in seen][:max_comments - collected]
+        seen.update(c["comment_id"] for c in page)
+        collected += len(page)
+        page_token = response.get("nextPageToken")
+
+        # Checkpoint: primeiro os comentários, depois o token
+        with open(partial_path, "a", encoding="utf-8") as f:
+            for c in page:
+                f.write(json.dumps(c, ensure_ascii=False) + "\n")
+        with open(checkpoint_path, "w", encoding="utf-8") as f:
+            json.dump({"next_page_token": page_token, "collected": collected}, f)
+
+        if page:
+            yield page
+
+        if not page_token:
+            break
+
+    # Coleta concluída: checkpoints não são mais necessários
+    for path in (checkpoint_path, partial_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def extract_youtube_comments(
+    video_id: str, 
+    max_comments: int = 50, 
+    order: str = "relevance",
+    include_replies: bool = False,
+    resume: bool = True,
+):
+
+    comments = []
+    for page in iter_youtube_comment_pages(
+        video_id,
+        max_comments=max_comments,
+        order=order,
+        include_replies=include_replies,
+        resume=resume,
+    ):
+        comments.extend(page)
+
+    return comments, order
+
+# ============================================================
+# PROCESSAMENTO INDIVIDUAL
+# ============================================================
+
+# Uma única chamada por comentário (chain "analysis"); os campos que vierem
+# ausentes ou inválidos são completados pelas chains individuais.
+FUSED_ANALYSIS = True
+
+ANALYSIS_FIELDS = ("language", "translated", "sentiment", "emotion", "keywords", "context")
+
+
+def parse_json_response(raw: str):
+    """
+    Extrai o primeiro objeto/lista JSON da resposta do LLM
+    (tolera blocos ```json e texto ao redor). Retorna None se falhar.
+    """
+    raw = (raw or "").strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`")
+        if raw.lower().startswith("json"):
+            raw = raw[4:]
+
+    starts = [i for i in (raw.find("{"), raw.find("[")) if i >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+    end = max(raw.rfind("}"), raw.rfind("]"))
+    if end <= start:
+        return None
+
+    try:
+        return json.loads(raw[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+
+
+# ------------------------------------------------------------
+# Normalização de rótulos: exato → fuzzy → re-pergunta
+# ------------------------------------------------------------
+
+LABEL_SETS = {
+    "sentiment": SENTIMENT_LABELS,
+    "emotion": EMOTION_LABELS,
+    "context": CONTEXT_LABELS,
+}
+LABEL_TASKS = {
+    "sentiment": "o sentimento predominante",
+    "emotion": "a emoção dominante",
+    "context": "o contexto",
+}
+# Respostas comuns fora da lista (geralmente em inglês)
+LABEL_SYNONYMS = {
+    "sentiment": {"positive": "positivo", "negative": "negativo", "neutral": "neutro"},
+    "emotion": {
+        "joy": "alegria", "happiness": "alegria", "love": "amor", "sadness": "tristeza",
+        "anger": "raiva", "surprise": "surpresa", "inspiration": "inspiração",
+        "reflection": "reflexão", "neutral": "neutro",
+    },
+    "context": {"musica": "sobre_a_musica", "letra": "trecho_de_letra", "offtopic": "off_topic"},
+}
+LABEL_FUZZY_CUTOFF = 0.8
+LABEL_REASK = True
+LABEL_FALLBACK = {"sentiment": "neutro", "emotion": "neutro", "context": "off_topic"}
+
+_LABEL_TOKEN_RE = re.compile(r"[^a-z0-9]+")
+
+
+def _label_key(text: str) -> str:
+    return _LABEL_TOKEN_RE.sub("_", _strip_accents(text.casefold())).strip("_")
+
+
+@functools.lru_cache(maxsize=None)
+def _label_index(field: str) -> dict:
+    index = {_label_key(k): v for k, v in LABEL_SYNONYMS.get(field, {}).items()}
+    index.update({_label_key(label): label for label in LABEL_SETS[field]})
+    return index
+
+
+def normalize_label(field: str, value):
+    """
+    Mapeia a resposta do modelo para um rótulo de `LABEL_SETS[field]`:
+    igualdade (ignorando caixa, acentos e pontuação), rótulo único citado
+    numa frase, e por fim similaridade (difflib). None se nada servir
+    (inclusive listas, dicts e outros valores que não são texto).
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return _normalize_label_text(field, value)
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_label_text(field: str, value: str):
+    import difflib
+
+    index = _label_index(field)
+    key = _label_key(value)
+    if key in index:
+        return index[key]
+
+    # "Sentimento: positivo." / "A emoção é alegria" → um único rótulo citado
+    padded = f"_{key}_"
+    found = {label for k, label in index.items() if f"_{k}_" in padded}
+    if len(found) == 1:
+        return found.pop()
+
+    candidates = [key, *key.split("_")] if len(key) <= 40 else key.split("_")
+    for candidate in candidates:
+        match = difflib.get_close_matches(candidate, index, n=1, cutoff=LABEL_FUZZY_CUTOFF)
+        if match:
+            return index[match[0]]
+    return None
+
+
+def _label_retry_inputs(field: str, text: str) -> dict:
+    return {"text": text, "task": LABEL_TASKS[field], "labels": ", ".join(LABEL_SETS[field])}
+
+
+def resolve_label(field: str, raw: str, text: str) -> str:
+    """Normaliza `raw`; se não servir, re-pergunta uma vez e, por fim, usa o rótulo padrão."""
+    label = normalize_label(field, raw)
+    if label is None and LABEL_REASK:
+        label = normalize_label(field, invoke_chain("label_retry", _label_retry_inputs(field, text)))
+    return label or LABEL_FALLBACK[field]
+
+
+async def aresolve_label(field: str, raw: str, text: str) -> str:
+    label = normalize_label(field, raw)
+    if label is None and LABEL_REASK:
+        label = normalize_label(field, await ainvoke_chain("label_retry", _label_retry_inputs(field, text)))
+    return label or LABEL_FALLBACK[field]
+
+
+def validate_analysis(data) -> dict:
+    """
+    Valida o JSON da análise fusionada.
+    Retorna apenas os campos válidos, já normalizados.
+    """
+    if not isinstance(data, dict):
+        return {}
+
+    valid = {}
+
+    lang = normalize_language_code(data.get("language")) if isinstance(data.get("language"), str) else ""
+    if lang:
+        valid["language"] = lang
+
+    translated = data.get("translated")
+    if isinstance(translated, str) and translated.strip():
+        valid["translated"] = translated.strip()
+
+    for field in LABEL_SETS:
+        label = normalize_label(field, data.get(field))
+        if label:
+            valid[field] = label
+
+    keywords = data.get("keywords")
+    if isinstance(keywords, list):
+        keywords = ", ".join(str(k).strip() for k in keywords if str(k).strip())
+    if isinstance(keywords, str) and keywords.strip():
+        valid["keywords"] = keywords.strip()
+
+    return valid
+
+
+# Tradução local: PT, só emojis/números ou textos muito curtos não vão ao LLM
+TRANSLATE_MIN_LETTERS = 4
+TRANSLATION_MEMORY_ENABLED = True
+TRANSLATION_MEMORY = {}     # texto original (expandido) → tradução já obtida
+
+
+def local_translation(text: str, text_expanded: str, lang: str):
+    """
+    Retorna a "tradução" sem chamar o LLM quando ela é desnecessária
+    ou já conhecida; None quando a chain "translate" é necessária.
+    """
+    if lang == "pt":
+        return text_expanded
+
+    # Só emojis (já expandidos para PT), números ou quase nenhuma letra
+    letters = sum(len(w) for w in _LETTERS_RE.findall(text))
+    if letters < TRANSLATE_MIN_LETTERS:
+        return text_expanded
+
+    if TRANSLATION_MEMORY_ENABLED:
+        return TRANSLATION_MEMORY.get(text_expanded)
+
+    return None
+
+
+def fill_local_translation(fields: dict, text_expanded: str, text: str = None) -> dict:
+    """
+    Os prompts fusionado/em lote pedem "translated": null para comentários em PT
+    (o modelo não gasta tokens repetindo o texto); aqui a tradução é preenchida
+    localmente quando o idioma permite.
+    """
+    if "translated" not in fields and "language" in fields:
+        local = local_translation(text_expanded if text is None else text, text_expanded, fields["language"])
+        if local is not None:
+            fields["translated"] = local
+    return fields
+
+
+def remember_translation(text_expanded: str, translated: str):
+    if TRANSLATION_MEMORY_ENABLED and translated:
+        TRANSLATION_MEMORY[text_expanded] = translated
+
+
+def complete_with_chains(text_expanded: str, partial: dict, text: str = None) -> dict:
+    """
+    Preenche, com as chains individuais, os campos que faltam em `partial`.
+    Com `partial` vazio equivale ao fluxo original (7 chamadas).
+    """
+    result = dict(partial)
+    text = text_expanded if text is None else text
+
+    # 1) Detectar idioma
+    if "language" not in result:
+        result["language"] = normalize_language_code(invoke_chain("language", {"text": text_expanded}))
+
+    # 2) Traduzir caso não seja PT
+    if "translated" not in result:
+        local = local_translation(text, text_expanded, result["language"])
+        if local is None:
+            local = invoke_chain("translate", {
+                "text": text_expanded,
+                "lang": result["language"]
+            }).strip()
+            remember_translation(text_expanded, local)
+        result["translated"] = local
+
+    translated = result["translated"]
+
+    if "sentiment" not in result:
+        result["sentiment"] = resolve_label("sentiment", invoke_chain("sentiment", {"text": translated}), translated)
+    if "emotion" not in result:
+        result["emotion"] = resolve_label("emotion", invoke_chain("emotion", {"text": translated}), translated)
+    if "keywords" not in result:
+        result["keywords"] = invoke_chain("keywords", {"text": translated}).strip()
+    if "context" not in result:
+        result["context"] = resolve_label("context", invoke_chain("context", {"text": translated}), translated)
+
+    return result
+
+
+def _parse_fused(raw: str, text_expanded: str, text: str) -> dict:
+    partial = fill_local_translation(validate_analysis(parse_json_response(raw)), text_expanded, text)
+
+    if len(partial) < len(ANALYSIS_FIELDS):
+        missing = [f for f in ANALYSIS_FIELDS if f not in partial]
+        print(f"⚠ Análise fusionada incompleta, usando chains para: {', '.join(missing)}")
+
+    return partial
+
+
+def process_comment(text: str, fused: bool = None):
+
+    text_expanded = emoji_to_text(text)
+
+    partial = {}
+    if FUSED_ANALYSIS if fused is None else fused:
+        partial = _parse_fused(invoke_chain("analysis", {"text": text_expanded}), text_expanded, text)
+
+    # Detecção local só cobre a falta de um idioma válido do LLM
+    if "language" not in partial:
+        local_lang = resolve_local_language(text)
+        if local_lang:
+            partial["language"] = local_lang
+
+    result = complete_with_chains(text_expanded, partial, text=text)
+
+    return {"emoji_expanded": text_expanded, **{f: result[f] for f in ANALYSIS_FIELDS}}
+
+
+async def acomplete_with_chains(text_expanded: str, partial: dict, text: str = None) -> dict:
+    """
+    Versão assíncrona de `complete_with_chains`: idioma e tradução em
+    sequência; sentimento, emoção, keywords e contexto em paralelo.
+    """
+    result = dict(partial)
+    text = text_expanded if text is None else text
+
+    if "language" not in result:
+        result["language"] = normalize_language_code(await ainvoke_chain("language", {"text": text_expanded}))
+
+    if "translated" not in result:
+        local = local_translation(text, text_expanded, result["language"])
+        if local is None:
+            local = (await ainvoke_chain("translate", {
+                "text": text_expanded,
+                "lang": result["language"]
+            })).strip()
+            remember_translation(text_expanded, local)
+        result["translated"] = local
+
+    translated = result["translated"]
+    pending = [f for f in ("sentiment", "emotion", "keywords", "context") if f not in result]
+
+    outputs = await asyncio.gather(*(ainvoke_chain(f, {"text": translated}) for f in pending))
+
+    labels = [f for f in pending if f in LABEL_SETS]
+    resolved = await asyncio.gather(*(
+        aresolve_label(f, out, translated) for f, out in zip(pending, outputs) if f in LABEL_SETS
+    ))
+    result.update(zip(labels, resolved))
+    if "keywords" in pending:
+        result["keywords"] = outputs[pending.index("keywords")].strip()
+
+    return result
+
+
+async def aprocess_comment(text: str, fused: bool = None):
+
+    text_expanded = emoji_to_text(text)
+
+    partial = {}
+    if FUSED_ANALYSIS if fused is None else fused:
+        partial = _parse_fused(await ainvoke_chain("analysis", {"text": text_expanded}), text_expanded, text)
+
+    if "language" not in partial:
+        local_lang = resolve_local_language(text)
+        if local_lang:
+            partial["language"] = local_lang
+
+    result = await acomplete_with_chains(text_expanded, partial, text=text)
+
+    return {"emoji_expanded": text_expanded, **{f: result[f] for f in ANALYSIS_FIELDS}}
+
+
+# ============================================================
+# ANÁLISE EM LOTE (vários comentários por requisição)
+# ============================================================
+
+BATCH_ANALYSIS = True
+BATCH_TOKEN_BUDGET = 3000      # tokens de entrada (comentários) por requisição
+BATCH_MAX_SIZE = 25            # limite de comentários por lote
+BATCH_MAX_RETRIES = 2          # re-tentativas para ids ausentes/inválidos
+
+
+def estimate_tokens(text: str) -> int:
+    # Aproximação barata (~4 caracteres por token), suficiente para dimensionar lotes
+    return max(1, len(text) // 4)
+
+
+def make_batches(items, token_budget=BATCH_TOKEN_BUDGET, max_size=BATCH_MAX_SIZE):
+    """
+    Agrupa itens {"comment_id", "text"} em lotes que respeitam o orçamento
+    de tokens. Um comentário maior que o orçamento vira um lote sozinho.
+    """
+    batch, used = [], 0
+
+    for item in items:
+        cost = estimate_tokens(item["text"]) + 10   # + overhead do JSON
+        if batch and (used + cost > token_budget or len(batch) >= max_size):
+            yield batch
+            batch, used = [], 0
+        batch.append(item)
+        used += cost
+
+    if batch:
+        yield batch
+
+
+def cached_analysis(text_expanded: str):
+    """
+    Resultado já conhecido de um comentário (chain "analysis", texto expandido),
+    venha ele da chamada individual ou de um lote. None se ausente/incompleto.
+    """
+    key = _cache_key("analysis", {"text": text_expanded}, False)
+    if key is None:
+        return None
+    cached = get_llm_cache().get(key)
+    if cached is None:
+        return None
+    fields = fill_local_translation(validate_analysis(parse_json_response(cached)), text_expanded)
+    if len(fields) < len(ANALYSIS_FIELDS):
+        return None
+    if METRICS_ENABLED:
+        METRICS.record_llm("analysis", cache_hit=True)
+    return fields
+
+
+def _store_batch_results(items, results: dict, provider):
+    """Grava cada resultado do lote no cache por comentário (chave da chain "analysis")."""
+    if provider is None or get_llm_cache() is None:
+        return
+    for item in items:
+        fields = results.get(item["comment_id"])
+        if fields:
+            key = _cache_key("analysis", {"text": item["text"]}, False, provider)
+            get_llm_cache().set(key, "analysis", json.dumps(fields, ensure_ascii=False))
+
+
+def _split_cached(pending):
+    """Separa os itens {"comment_id", "text"} já presentes no cache por comentário."""
+    hits, misses = {}, []
+    for item in pending:
+        fields = cached_analysis(item["text"])
+        if fields is None:
+            misses.append(item)
+        else:
+            hits[item["comment_id"]] = fields
+    return hits, misses
+
+
+def analyze_batch(items) -> dict:
+    """
+    Envia um lote para a chain "analysis_batch".
+    Retorna {comment_id: campos_validos} apenas para os itens completos.
+    O lote em si não é cacheado (as fronteiras mudam a cada coleta); cada
+    resultado é guardado por comentário.
+    """
+    payload = json.dumps(items, ensure_ascii=False)
+    raw, provider = _invoke("analysis_batch", {"comments": payload}, bypass_cache=True)
+    results = _map_batch_response(items, raw)
+    _store_batch_results(items, results, provider)
+    return results
+
+
+async def aanalyze_batch(items) -> dict:
+    payload = json.dumps(items, ensure_ascii=False)
+    raw, provider = await _ainvoke("analysis_batch", {"comments": payload}, bypass_cache=True)
+    results = _map_batch_response(items, raw)
+    _store_batch_results(items, results, provider)
+    return results
+
+
+def _map_batch_response(items, raw: str) -> dict:
+    data = parse_json_response(raw)
+
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        return {}
+
+    texts = {item["comment_id"]: item["text"] for item in items}
+    expected = set(texts)
+    results = {}
+
+    for entry in data:
+        if not isinstance(entry, dict) or entry.get("comment_id") not in expected:
+            continue
+        valid = fill_local_translation(validate_analysis(entry), texts[entry["comment_id"]])
+        if len(valid) == len(ANALYSIS_FIELDS):
+            results[entry["comment_id"]] = valid
+
+    return results
+
+
+def process_comments_batched(
+    comments,
+    token_budget: int = None,
+    max_size: int = None,
+    max_retries: int = None,
+):
+    """
+    Gera (comentário, resultado) na ordem original. Ids ausentes ou
+    malformados voltam para a fila; após `max_retries` rodadas, caem
+    para o processamento individual (`process_comment`).
+    """
+    token_budget = BATCH_TOKEN_BUDGET if token_budget is None else token_budget
+    max_size = BATCH_MAX_SIZE if max_size is None else max_size
+    max_retries = BATCH_MAX_RETRIES if max_retries is None else max_retries
+
+    expanded = {}
+    pending = []
+    for c in comments:
+        expanded[c["comment_id"]] = emoji_to_text(c["text"])
+        pending.append({"comment_id": c["comment_id"], "text": expanded[c["comment_id"]]})
+
+    results, pending = _split_cached(pending)
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        for batch in make_batches(pending, token_budget, max_size):
+            results.update(analyze_batch(batch))
+        pending = [item for item in pending if item["comment_id"] not in results]
+        if pending:
+            print(f"⚠ {len(pending)} comentário(s) sem resposta válida no lote, re-enfileirando")
+
+    for c in comments:
+        cid = c["comment_id"]
+        if cid in results:
+            fields = {f: results[cid][f] for f in ANALYSIS_FIELDS}
+            fields["language"] = merge_language(fields["language"], c["text"])
+            yield c, {"emoji_expanded": expanded[cid], **fields}
+        else:
+            yield c, process_comment(c["text"])
+
+
+async def aprocess_comments_batched(
+    comments,
+    on_result,
+    token_budget: int = None,
+    max_size: int = None,
+    max_retries: int = None,
+):
+    """
+    Versão assíncrona de `process_comments_batched`: os lotes de cada rodada
+    são enviados em paralelo e `on_result(comentário, resultado)` é chamado
+    assim que cada comentário fica pronto.
+    """
+    token_budget = BATCH_TOKEN_BUDGET if token_budget is None else token_budget
+    max_size = BATCH_MAX_SIZE if max_size is None else max_size
+    max_retries = BATCH_MAX_RETRIES if max_retries is None else max_retries
+
+    by_id = {c["comment_id"]: c for c in comments}
+    expanded = {cid: emoji_to_text(c["text"]) for cid, c in by_id.items()}
+    pending = [{"comment_id": cid, "text": expanded[cid]} for cid in by_id]
+
+    def deliver(cid, fields):
+        fields = {f: fields[f] for f in ANALYSIS_FIELDS}
+        fields["language"] = merge_language(fields["language"], by_id[cid]["text"])
+        on_result(by_id[cid], {"emoji_expanded": expanded[cid], **fields})
+
+    hits, pending = _split_cached(pending)
+    for cid, fields in hits.items():
+        deliver(cid, fields)
+
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+
+        batches = list(make_batches(pending, token_budget, max_size))
+        done = set()
+        for fut in asyncio.as_completed([aanalyze_batch(b) for b in batches]):
+            for cid, fields in (await fut).items():
+                done.add(cid)
+                deliver(cid, fields)
+
+        pending = [item for item in pending if item["comment_id"] not in done]
+        if pending:
+            print(f"⚠ {len(pending)} comentário(s) sem resposta válida no lote, re-enfileirando")
+
+    async def fallback(c):
+        on_result(c, await aprocess_comment(c["text"]))
+
+    await asyncio.gather(*(fallback(by_id[item["comment_id"]]) for item in pending))
+
+
+# ============================================================
+# DEDUPLICAÇÃO (exatos e quase-duplicados) ANTES DA ANÁLISE
+# ============================================================
+
+DEDUP_ANALYSIS = True
+DEDUP_THRESHOLD = 0.75     # similaridade de Jaccard mínima (shingles de caracteres)
+DEDUP_SHINGLE_SIZE = 4
+DEDUP_NUM_PERM = 64        # tamanho da assinatura MinHash
+DEDUP_BANDS = 16           # bandas do LSH (64 / 16 = 4 linhas por banda)
+
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_for_dedup(text: str) -> str:
+    """emojis → texto, caixa, pontuação e espaços normalizados."""
+    text = emoji_to_text(text).casefold()
+    text = _PUNCT_RE.sub("", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def _shingles(text: str, size: int = None) -> frozenset:
+    size = DEDUP_SHINGLE_SIZE if size is None else size
+    if len(text) <= size:
+        return frozenset([text])
+    return frozenset(text[i:i + size] for i in range(len(text) - size + 1))
+
+
+@functools.lru_cache(maxsize=None)
+def _minhash_params(num_perm: int):
+    import numpy as np
+
+    rng = np.random.RandomState(1)
+    a = rng.randint(0, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)  # ímpares
+    b = rng.randint(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def _minhash_batch(shingle_sets, num_perm: int = None) -> list:
+    """
+    Assinaturas MinHash de vários conjuntos de shingles numa só operação:
+    cada shingle é hasheado uma vez e as `num_perm` permutações são
+    multiply-shift ((a·h + b) mod 2⁶⁴) >> 32, vetorizadas com numpy sobre
+    todos os shingles.
+    """
+    import numpy as np
+
+    shingle_sets = list(shingle_sets)
+    if not shingle_sets:
+        return []
+
+    a, b = _minhash_params(DEDUP_NUM_PERM if num_perm is None else num_perm)
+    sizes = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    hashes = np.fromiter(
+        (hash(sh) & 0xFFFFFFFF for s in shingle_sets for sh in s),
+        dtype=np.uint64, count=int(sizes.sum()),
+    )
+    # O estouro do uint64 é o "mod 2⁶⁴" do multiply-shift
+    permuted = (hashes[:, None] * a + b) >> np.uint64(32)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    signatures = np.minimum.reduceat(permuted, starts, axis=0)
+    return [tuple(row) for row in signatures.tolist()]
+
+
+def group_duplicates(texts, threshold: float = None):
+    """
+    Agrupa textos idênticos após normalização e, com threshold < 1,
+    também quase-duplicados (MinHash + LSH, confirmados por Jaccard).
+    Retorna listas de índices; cada grupo na ordem de entrada.
+    """
+    threshold = DEDUP_THRESHOLD if threshold is None else threshold
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    # 1) Duplicados exatos: bucket pelo texto normalizado. Se a normalização
+    # apaga tudo (só pontuação ou emojis sem nome), a chave é o texto original:
+    # "💯💯💯", "🥲" e "?" não são o mesmo comentário
+    first_seen = {}
+    for i, text in enumerate(texts):
+        norm = normalize_for_dedup(text)
+        key = norm or ("raw", text.strip())
+        if key in first_seen:
+            union(first_seen[key], i)
+        else:
+            first_seen[key] = i
+
+    # 2) Quase-duplicados: um representante por texto normalizado distinto
+    if threshold < 1.0 and len(first_seen) > 1:
+        rows = DEDUP_NUM_PERM // DEDUP_BANDS
+        shingle_sets = {}
+        buckets = {}
+
+        for norm, i in first_seen.items():
+            if isinstance(norm, str):
+                shingle_sets[i] = _shingles(norm)
+
+        for i, signature in zip(shingle_sets, _minhash_batch(shingle_sets.values())):
+            for band in range(DEDUP_BANDS):
+                key = (band, signature[band * rows:(band + 1) * rows])
+                buckets.setdefault(key, []).append(i)
+
+        checked = set()
+        for members in buckets.values():
+            for a_pos, a in enumerate(members):
+                for b in members[a_pos + 1:]:
+                    if (a, b) in checked:
+                        continue
+                    checked.add((a, b))
+                    sa, sb = shingle_sets[a], shingle_sets[b]
+                    if len(sa & sb) / len(sa | sb) >= threshold:
+                        union(a, b)
+
+    groups = {}
+    for i in range(len(texts)):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+# ============================================================
+# CLASSIFICADOR LOCAL (TF-IDF + modelo linear) COM ESCALONAMENTO AO LLM
+# ============================================================
+
+# Com o classificador ativo, comentários em que o modelo local tem margem
+# suficiente nos três rótulos (e não precisam de tradução) não vão ao LLM.
+LOCAL_CLASSIFIER = False
+LOCAL_MODEL_PATH = "youtube_comments/.cache/local_classifier.pkl"
+LOCAL_EVAL_PATH = "youtube_comments/.cache/local_classifier_eval.json"
+LOCAL_MODEL_FORMAT = 2         # 1: pickle da própria LocalClassifier (preso ao módulo que a definiu)
+LOCAL_MIN_MARGIN = 0.35        # diferença mínima entre as duas classes mais prováveis
+LOCAL_MIN_TRAINING = 200       # registros rotulados pelo LLM necessários para treinar
+LOCAL_RETRAIN_GROWTH = 0.25    # retreina quando os registros rotulados crescem 25%
+LOCAL_RECHECK_SECONDS = 600    # intervalo mínimo entre verificações dos dados de treino
+LOCAL_KEYWORDS_MAX = 10
+
+KEYWORD_STOPWORDS = frozenset("""
+    a o as os um uma uns umas de do da dos das no na nos nas em por para pra pro com sem
+    e ou mas que se nao não sim eu tu ele ela nós nos vos eles elas me te lhe meu minha
+    seu sua isso isto esse essa este esta aquele aquela ja já tao tão muito mais menos
+    como quando onde porque pois foi era ser ter tem tinha está esta estou sou vai vou
+    the and or but for with this that you your are was were have has its it's i'm just
+""".split())
+
+
+def _training_text(record: dict) -> str:
+    return record.get("emoji_expanded") or emoji_to_text(record.get("text", ""))
+
+
+def local_keywords(text: str, k: int = LOCAL_KEYWORDS_MAX) -> str:
+    """Keywords sem LLM: palavras de conteúdo do comentário, na ordem em que aparecem."""
+    seen = {}
+    for word in _LETTERS_RE.findall(text.casefold()):
+        if len(word) < 3 or word in KEYWORD_STOPWORDS:
+            continue
+        key, display = normalize_keyword(word)
+        seen.setdefault(key, display)
+        if len(seen) >= k:
+            break
+    return ", ".join(seen.values())
+
+
+def load_labeled_records(root: str = "youtube_comments") -> list:
+    """
+    Registros já analisados pelo LLM em todos os vídeos, para treino/avaliação.
+    Rótulos vindos do próprio classificador local são descartados.
+    """
+    if not os.path.isdir(root):
+        return []
+    records = []
+    for vid in sorted(os.listdir(root)):
+        if vid.startswith(".") or not os.path.isdir(f"{root}/{vid}"):
+            continue
+        for r in _load_records(f"{root}/{vid}/comentarios_analisados_{vid}"):
+            if isinstance(r, dict) and r.get("text") and r.get("label_source") != "local":
+                records.append(r)
+    return records
+
+
+class LocalClassifier:
+    """
+    Vetorização por hashing de n-gramas de caracteres + TF-IDF e uma
+    regressão logística por campo (sentiment, emotion, context).
+    Treinado com os rótulos que o LLM já produziu.
+    """
+
+    def __init__(self, min_margin: float = LOCAL_MIN_MARGIN):
+        self.min_margin = min_margin
+        self.vectorizer = None
+        self.models = {}
+        self.trained_on = 0
+
+    @staticmethod
+    def _make_vectorizer():
+        from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+        from sklearn.pipeline import make_pipeline
+
+        return make_pipeline(
+            HashingVectorizer(
+                analyzer="char_wb", ngram_range=(2, 4), n_features=2 ** 18,
+                alternate_sign=False, norm=None,
+            ),
+            TfidfTransformer(sublinear_tf=True),
+        )
+
+    @property
+    def ready(self) -> bool:
+        return all(field in self.models for field in LABEL_SETS)
+
+    def fit(self, records):
+        from sklearn.linear_model import LogisticRegression
+
+        records = list(records)
+        self.trained_on = len(records)
+        self.vectorizer = self._make_vectorizer()
+        X = self.vectorizer.fit_transform([_training_text(r) for r in records])
+
+        self.models = {}
+        for field, labels in LABEL_SETS.items():
+            rows = [i for i, r in enumerate(records) if r.get(field) in labels]
+            y = [records[i][field] for i in rows]
+            if len(rows) < LOCAL_MIN_TRAINING or len(set(y)) < 2:
+                continue
+            self.models[field] = LogisticRegression(max_iter=1000, C=4.0).fit(X[rows], y)
+        return self
+
+    def predict(self, texts) -> list:
+        """Para cada texto, `{campo: (rótulo, margem)}` calculado em lote."""
+        import numpy as np
+
+        texts = list(texts)
+        predictions = [{} for _ in texts]
+        if not texts or self.vectorizer is None:
+            return predictions
+
+        X = self.vectorizer.transform(texts)
+        for field, model in self.models.items():
+            proba = model.predict_proba(X)
+            top2 = np.sort(proba, axis=1)[:, -2:]
+            margins = top2[:, -1] - (top2[:, 0] if proba.shape[1] > 1 else 0.0)
+            labels = model.classes_[proba.argmax(axis=1)]
+            for pred, label, margin in zip(predictions, labels, margins):
+                pred[field] = (str(label), float(margin))
+        return predictions
+
+    def is_confident(self, prediction: dict) -> bool:
+        return all(field in prediction and prediction[field][1] >= self.min_margin for field in LABEL_SETS)
+
+    def analyze(self, comments) -> dict:
+        """
+        Resolve localmente o que der: `{id(comentário): resultado}` apenas para
+        comentários com margem suficiente e idioma PT (ou sem texto a traduzir).
+        """
+        comments = list(comments)
+        expanded = emoji_to_text_batch([c["text"] for c in comments])
+        resolved = {}
+
+        for c, text_expanded, pred in zip(comments, expanded, self.predict(expanded)):
+            if not self.is_confident(pred):
+                continue
+            lang = resolve_local_language(text_expanded)
+            translated = local_translation(c["text"], text_expanded, lang) if lang else None
+            if translated is None:
+                continue
+            resolved[id(c)] = {
+                "emoji_expanded": text_expanded,
+                "language": lang,
+                "translated": translated,
+                **{field: label for field, (label, _) in pred.items()},
+                "keywords": local_keywords(text_expanded),
+                "label_source": "local",
+            }
+        return resolved
+
+    def save(self, path: str = LOCAL_MODEL_PATH):
+        import joblib
+
+        # Só objetos do sklearn e tipos básicos: o arquivo não referencia esta
+        # classe e carrega tanto com o script executado (__main__) quanto importado
+        state = {
+            "format": LOCAL_MODEL_FORMAT,
+            "vectorizer": self.vectorizer,
+            "models": self.models,
+            "min_margin": self.min_margin,
+            "trained_on": self.trained_on,
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            joblib.dump(state, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = LOCAL_MODEL_PATH):
+        """Modelo gravado por `save`; None se o arquivo for de outro formato (é retreinado)."""
+        import joblib
+
+        try:
+            state = joblib.load(path)
+        except Exception as e:
+            print(f"⚠ Classificador local ilegível ({type(e).__name__}); será retreinado")
+            return None
+        if not isinstance(state, dict) or state.get("format") != LOCAL_MODEL_FORMAT:
+            return None
+
+        classifier = cls(min_margin=state["min_margin"])
+        classifier.vectorizer = state["vectorizer"]
+        classifier.models = state["models"]
+        classifier.trained_on = state["trained_on"]
+        return classifier
+
+
+_LOCAL_CLASSIFIER = None
+_LOCAL_CLASSIFIER_LOCK = threading.Lock()
+_LOCAL_TRAINING_BASE = None    # registros na última tentativa de treino (-1: nenhuma)
+_LOCAL_CHECKED_AT = None       # time.monotonic() da última verificação
+
+
+def train_local_classifier(records=None, path: str = LOCAL_MODEL_PATH):
+    """Treina com os comentários já analisados e grava o modelo; None se faltar dado."""
+    global _LOCAL_CLASSIFIER
+
+    records = load_labeled_records() if records is None else records
+    classifier = LocalClassifier().fit(records)
+    if not classifier.ready:
+        print(f"⚠ Classificador local: dados insuficientes ({len(records)} registros)")
+        return None
+
+    classifier.save(path)
+    _LOCAL_CLASSIFIER = classifier
+    print(f"🏷 Classificador local treinado com {len(records)} registros")
+    return classifier
+
+
+def get_local_classifier():
+    """
+    Modelo gravado, ou treinado na hora (None se não houver dados).
+    A resposta — inclusive "dados insuficientes" — vale por LOCAL_RECHECK_SECONDS;
+    depois disso, o modelo é retreinado se os registros rotulados cresceram
+    LOCAL_RETRAIN_GROWTH desde a última tentativa.
+    """
+    global _LOCAL_CLASSIFIER, _LOCAL_TRAINING_BASE, _LOCAL_CHECKED_AT
+
+    with _LOCAL_CLASSIFIER_LOCK:
+        now = time.monotonic()
+        if _LOCAL_CHECKED_AT is None or now - _LOCAL_CHECKED_AT >= LOCAL_RECHECK_SECONDS:
+            _LOCAL_CHECKED_AT = now
+            if _LOCAL_TRAINING_BASE is None:
+                _LOCAL_TRAINING_BASE = -1
+                if os.path.exists(LOCAL_MODEL_PATH):
+                    _LOCAL_CLASSIFIER = LocalClassifier.load(LOCAL_MODEL_PATH)
+                    if _LOCAL_CLASSIFIER is not None:
+                        _LOCAL_TRAINING_BASE = _LOCAL_CLASSIFIER.trained_on
+
+            records = load_labeled_records()
+            if _LOCAL_TRAINING_BASE < 0 or len(records) > _LOCAL_TRAINING_BASE * (1 + LOCAL_RETRAIN_GROWTH):
+                _LOCAL_TRAINING_BASE = len(records)
+                train_local_classifier(records)
+        return _LOCAL_CLASSIFIER if _LOCAL_CLASSIFIER is not None and _LOCAL_CLASSIFIER.ready else None
+
+
+def evaluate_local_classifier(records=None, test_fraction: float = 0.2, min_margin: float = LOCAL_MIN_MARGIN,
+                              path: str = LOCAL_EVAL_PATH) -> dict:
+    """
+    Avaliação offline: treina com parte dos rótulos do LLM e mede, no restante,
+    a concordância geral e a concordância/cobertura acima de `min_margin`.
+    """
+    records = load_labeled_records() if records is None else list(records)
+    records = records[:]
+    random.Random(0).shuffle(records)
+
+    split = int(len(records) * (1 - test_fraction))
+    train, test = records[:split], records[split:]
+    classifier = LocalClassifier(min_margin=min_margin).fit(train)
+    predictions = classifier.predict([_training_text(r) for r in test])
+
+    report = {"train": len(train), "test": len(test), "min_margin": min_margin, "fields": {}}
+    for field, labels in LABEL_SETS.items():
+        pairs = [
+            (pred[field], r[field]) for r, pred in zip(test, predictions)
+            if field in pred and r.get(field) in labels
+        ]
+        confident = [(label, truth) for (label, margin), truth in pairs if margin >= min_margin]
+        report["fields"][field] = {
+            "evaluated": len(pairs),
+            "agreement": round(sum(l == t for (l, _), t in pairs) / len(pairs), 4) if pairs else None,
+            "coverage": round(len(confident) / len(pairs), 4) if pairs else None,
+            "agreement_confident": round(sum(l == t for l, t in confident) / len(confident), 4) if confident else None,
+        }
+
+    all_confident = sum(classifier.is_confident(p) for p in predictions)
+    report["local_share"] = round(all_confident / len(test), 4) if test else None
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    save_json(path, report)
+
+    print(f"\n=== CLASSIFICADOR LOCAL vs LLM (treino {len(train)} | teste {len(test)}) ===")
+    print(f"{'campo':<10} {'concord.':>9} {'cobertura':>10} {'concord. conf.':>15}")
+    for field, row in report["fields"].items():
+        fmt = lambda v: "—" if v is None else f"{v:.1%}"
+        print(f"{field:<10} {fmt(row['agreement']):>9} {fmt(row['coverage']):>10} {fmt(row['agreement_confident']):>15}")
+    share = report["local_share"]
+    print(f"Resolvidos localmente (margem ≥ {min_margin}): {'—' if share is None else f'{share:.1%}'}\n")
+    return report
+
+
+# ============================================================
+# ANÁLISE COMPLETA COM LOGS
+# ============================================================
+
+# Requisições simultâneas ao LLM; 1 mantém o fluxo serial original
+ANALYSIS_CONCURRENCY = 16
+
+
+def _log_progress(idx, total, c, processed):
+    print(f"[{idx}/{total}] Comentário analisado:")
+    print(f"Texto: {c['text'][:90]}")
+    print(f"Sentimento: {processed['sentiment']} | Emoção: {processed['emotion']} | Contexto: {processed['context']}")
+    print("-" * 70)
+
+
+async def analyze_comments_async(
+    comments,
+    batch: bool = None,
+    concurrency: int = None,
+    on_record=None,
+):
+    """
+    Motor assíncrono: no máximo `concurrency` requisições em voo.
+    A saída mantém a ordem de entrada; os logs seguem a ordem de conclusão.
+    `on_record(comentário, registro)` é chamado a cada comentário concluído.
+    """
+    batch = BATCH_ANALYSIS if batch is None else batch
+    concurrency = ANALYSIS_CONCURRENCY if concurrency is None else concurrency
+    print("\n=== INICIANDO ANÁLISE DOS COMENTÁRIOS ===\n")
+
+    valid = []
+    for c in comments:
+        if not isinstance(c, dict) or "text" not in c:
+            print(f"⚠ Comentário ignorado (formato inesperado): {c}")
+            continue
+        valid.append(c)
+
+    _INFLIGHT.set(asyncio.Semaphore(max(1, concurrency)))
+
+    slots = {id(c): pos for pos, c in enumerate(valid)}
+    results = [None] * len(valid)
+    completed = 0
+
+    def on_result(c, processed):
+        nonlocal completed
+        completed += 1
+        results[slots[id(c)]] = {**c, **processed}
+        _log_progress(completed, len(comments), c, processed)
+        if on_record is not None:
+            on_record(c, results[slots[id(c)]])
+
+    if batch and all("comment_id" in c for c in valid):
+        await aprocess_comments_batched(valid, on_result)
+    else:
+        async def run(c):
+            on_result(c, await aprocess_comment(c["text"]))
+
+        await asyncio.gather(*(run(c) for c in valid))
+
+    print("\n=== ANÁLISE COMPLETA ===\n")
+
+    return results
+
+
+def analyze_comments(
+    comments,
+    batch: bool = None,
+    concurrency: int = None,
+    dedup: bool = None,
+    dedup_threshold: float = None,
+    on_record=None,
+):
+    """
+    Analisa os comentários. Com `dedup`, apenas um representante de cada
+    grupo de (quase-)duplicados vai ao LLM e o resultado é replicado para
+    todos os membros, registrando o grupo em `duplicate_group`.
+    `on_record(registro)` é chamado assim que cada comentário fica pronto.
+    Parâmetros None seguem os flags do módulo (BATCH_ANALYSIS, ANALYSIS_CONCURRENCY,
+    DEDUP_ANALYSIS, DEDUP_THRESHOLD).
+    """
+    if not (DEDUP_ANALYSIS if dedup is None else dedup):
+        notify = None if on_record is None else (lambda c, record: on_record(record))
+        return run_analysis(comments, batch=batch, concurrency=concurrency, on_record=notify)
+
+    valid = []
+    for c in comments:
+        if not isinstance(c, dict) or "text" not in c:
+            print(f"⚠ Comentário ignorado (formato inesperado): {c}")
+            continue
+        valid.append(c)
+
+    groups = group_duplicates([c["text"] for c in valid], threshold=dedup_threshold)
+
+    # Representante: o comentário mais curtido do grupo
+    reps = [max(g, key=lambda i: (valid[i].get("like_count") or 0, -i)) for g in groups]
+    print(f"🔁 {len(valid)} comentários agrupados em {len(groups)} grupos para análise")
+
+    results = [None] * len(valid)
+    group_of_rep = {id(valid[rep]): (group, rep) for group, rep in zip(groups, reps)}
+
+    def fan_out(rep_comment, rep_result):
+        group, rep = group_of_rep[id(rep_comment)]
+        group_id = valid[rep].get("comment_id", rep)
+        for i in group:
+            c = valid[i]
+            fields = {f: rep_result[f] for f in ANALYSIS_FIELDS}
+            if "label_source" in rep_result:
+                fields["label_source"] = rep_result["label_source"]
+            emoji_expanded = rep_result["emoji_expanded"] if i == rep else emoji_to_text(c["text"])
+            results[i] = {
+                **c,
+                "emoji_expanded": emoji_expanded,
+                **fields,
+                "duplicate_group": group_id,
+                "duplicate_group_size": len(group),
+            }
+            if on_record is not None:
+                on_record(results[i])
+
+    run_analysis([valid[i] for i in reps], batch=batch, concurrency=concurrency, on_record=fan_out)
+
+    return results
+
+
+def run_analysis(
+    comments,
+    batch: bool = None,
+    concurrency: int = None,
+    on_record=None,
+    local_tier: bool = None,
+):
+    batch = BATCH_ANALYSIS if batch is None else batch
+    concurrency = ANALYSIS_CONCURRENCY if concurrency is None else concurrency
+
+    if LOCAL_CLASSIFIER if local_tier is None else local_tier:
+        classifier = get_local_classifier()
+        if classifier is not None:
+            return _run_with_local_tier(classifier, comments, batch, concurrency, on_record)
+
+    if concurrency > 1:
+        return asyncio.run(analyze_comments_async(
+            comments, batch=batch, concurrency=concurrency, on_record=on_record
+        ))
+
+    enriched_data = []
+
+    print("\n=== INICIANDO ANÁLISE DOS COMENTÁRIOS ===\n")
+
+    valid = []
+    for c in comments:
+        # NOVO: proteção contra formatos inválidos
+        if not isinstance(c, dict) or "text" not in c:
+            print(f"⚠ Comentário ignorado (formato inesperado): {c}")
+            continue
+        valid.append(c)
+
+    if batch and all("comment_id" in c for c in valid):
+        processed_iter = process_comments_batched(valid)
+    else:
+        processed_iter = ((c, process_comment(c["text"])) for c in valid)
+
+    for idx, (c, processed) in enumerate(processed_iter, start=1):
+        enriched = {**c, **processed}
+        enriched_data.append(enriched)
+
+        _log_progress(idx, len(comments), c, processed)
+        if on_record is not None:
+            on_record(c, enriched)
+
+    print("\n=== ANÁLISE COMPLETA ===\n")
+
+    return enriched_data
+
+def _run_with_local_tier(classifier, comments, batch, concurrency, on_record):
+    """Classifica em lote localmente e manda ao LLM só o que ficou com margem baixa."""
+    valid = [c for c in comments if isinstance(c, dict) and "text" in c]
+    local = classifier.analyze(valid)
+    print(f"🏷 Classificador local: {len(local)}/{len(valid)} resolvidos | {len(valid) - len(local)} vão ao LLM")
+
+    by_id = {}
+
+    def collect(c, enriched):
+        by_id[id(c)] = enriched
+        if on_record is not None:
+            on_record(c, enriched)
+
+    for c in valid:
+        if id(c) in local:
+            collect(c, {**c, **local[id(c)]})
+
+    escalated = [c for c in comments if id(c) not in local]
+    if escalated:
+        run_analysis(escalated, batch=batch, concurrency=concurrency, on_record=collect, local_tier=False)
+
+    return [by_id[id(c)] for c in valid if id(c) in by_id]
+
+# ============================================================
+# AGRUPAMENTO SEMÂNTICO (embeddings + mini-batch k-means)
+# ============================================================
+
+# Com o agrupamento ativo, resumo e corpo do PDF usam só os representantes
+# de cada grupo (custo proporcional ao número de grupos, não de comentários)
+SEMANTIC_CLUSTERING = False
+CLUSTER_MIN_COMMENTS = 200        # abaixo disso, todos os comentários são usados
+CLUSTER_MAX_K = 40
+CLUSTER_EMBED_DIM = 1024
+CLUSTER_REPRESENTATIVES = 3       # representantes por grupo
+CLUSTER_EMBED_BATCH = 4096
+
+# Anotados sobre o conjunto inteiro: deixam de valer quando o conjunto muda
+CLUSTER_FIELDS = ("cluster", "cluster_size", "cluster_representative")
+
+
+def embed_comments(texts, dim: int = CLUSTER_EMBED_DIM, path: str = None):
+    """
+    Embeddings por hashing (palavras e bigramas, norma L2) em uma matriz
+    float32 N×dim. Com `path`, a matriz é um .npy mapeado em memória.
+    """
+    import numpy as np
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    vectorizer = HashingVectorizer(
+        n_features=dim, ngram_range=(1, 2), strip_accents="unicode", norm="l2",
+    )
+    texts = list(texts)
+    shape = (len(texts), dim)
+    if path:
+        matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+    else:
+        matrix = np.zeros(shape, dtype=np.float32)
+
+    for start in range(0, len(texts), CLUSTER_EMBED_BATCH):
+        block = texts[start:start + CLUSTER_EMBED_BATCH]
+        matrix[start:start + len(block)] = vectorizer.transform(block).toarray()
+    return matrix
+
+
+def cluster_count(n: int) -> int:
+    return max(2, min(CLUSTER_MAX_K, int((n / 2) ** 0.5)))
+
+
+def cluster_comments(analyzed, k: int = None, representatives: int = CLUSTER_REPRESENTATIVES, path: str = None) -> list:
+    """
+    Agrupa os comentários e anota em cada registro `cluster`, `cluster_size`
+    e, nos escolhidos, `cluster_representative`. Os representantes são os mais
+    próximos do centróide, ponderados pelas curtidas. Grupos numerados do
+    maior para o menor. Retorna o resumo por grupo (seção do stats JSON).
+    """
+    import numpy as np
+    from sklearn.cluster import MiniBatchKMeans
+
+    X = embed_comments([c.get("translated") or c.get("text") or "" for c in analyzed], path=path)
+    k = min(k or cluster_count(len(analyzed)), len(analyzed))
+
+    model = MiniBatchKMeans(n_clusters=k, random_state=0, batch_size=1024, n_init=3)
+    labels = model.fit_predict(X)
+
+    centroids = model.cluster_centers_
+    centroids = centroids / np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    similarity = np.einsum("ij,ij->i", X, centroids[labels])
+    likes = np.array([c.get("like_count") or 0 for c in analyzed], dtype=np.float64)
+    score = similarity * (1 + np.log1p(likes))
+
+    members_by_label = [np.flatnonzero(labels == label) for label in range(k)]
+    members_by_label = sorted((m for m in members_by_label if len(m)), key=len, reverse=True)
+
+    clusters = []
+    for cluster_id, members in enumerate(members_by_label):
+        chosen = members[np.argsort(-score[members], kind="stable")[:representatives]]
+        group = [analyzed[i] for i in members]
+
+        for c in group:
+            c.pop("cluster_representative", None)
+            c["cluster"] = cluster_id
+            c["cluster_size"] = len(members)
+        for i in chosen:
+            analyzed[i]["cluster_representative"] = True
+
+        keywords = KeywordIndex()
+        keywords.update(group)
+        clusters.append({
+            "cluster": cluster_id,
+            "size": len(members),
+            "likes": int(likes[members].sum()),
+            "sentiment_counts": dict(Counter(c.get("sentiment") for c in group if c.get("sentiment")).most_common()),
+            "top_keywords": list(keywords.most_common(5)),
+            "representatives": [analyzed[i].get("comment_id") for i in chosen],
+        })
+
+    return clusters
+
+
+def apply_semantic_clustering(video_id: str, analyzed, enabled: bool = None) -> list:
+    """Agrupa `analyzed` (em memória) se ativado e se houver comentários suficientes."""
+    enabled = SEMANTIC_CLUSTERING if enabled is None else enabled
+    if not enabled or len(analyzed) < CLUSTER_MIN_COMMENTS:
+        return []
+
+    base_dir = f"youtube_comments/{video_id}"
+    os.makedirs(base_dir, exist_ok=True)
+    clusters = cluster_comments(analyzed, path=f"{base_dir}/embeddings_{video_id}.npy")
+    print(f"🧩 {len(analyzed)} comentários agrupados em {len(clusters)} grupos semânticos")
+    return clusters
+
+
+# ============================================================
+# RESUMO FINAL
+# ============================================================
+
+SUMMARY_CHUNK_TOKENS = 6000       # tamanho de cada bloco enviado ao "summary"
+SUMMARY_REDUCE_TOKENS = 6000      # limite de resumos parciais por chamada de redução
+SUMMARY_MAX_COMMENTS = None       # amostragem ponderada por curtidas (None = todos)
+SUMMARY_WEIGHT_BY_LIKES = False   # anota as curtidas de cada comentário no texto
+
+
+def sample_by_likes(comments, k: int, seed: int = 0) -> list:
+    """
+    Amostra ponderada sem reposição (Efraimidis–Spirakis), peso = 1 + curtidas.
+    Determinística para a mesma entrada.
+    """
+    rng = random.Random(seed)
+    keyed = [
+        (rng.random() ** (1.0 / (1 + (c.get("like_count") or 0))), pos)
+        for pos, c in enumerate(comments)
+    ]
+    chosen = sorted(pos for _, pos in sorted(keyed, reverse=True)[:k])
+    return [comments[pos] for pos in chosen]
+
+
+def chunk_by_tokens(lines, max_tokens: int) -> list:
+    chunks, current, used = [], [], 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if current and used + cost > max_tokens:
+            chunks.append("\n".join(current))
+            current, used = [], 0
+        current.append(line)
+        used += cost
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+async def _summarize_all(chain_name: str, chunks) -> list:
+    _INFLIGHT.set(asyncio.Semaphore(max(1, ANALYSIS_CONCURRENCY)))
+    outputs = await asyncio.gather(*(ainvoke_chain(chain_name, {"text": chunk}) for chunk in chunks))
+    return [o.strip() for o in outputs]
+
+
+def generate_final_summary(
+    analyzed_comments,
+    chunk_tokens: int = SUMMARY_CHUNK_TOKENS,
+    reduce_tokens: int = SUMMARY_REDUCE_TOKENS,
+    max_comments: int = SUMMARY_MAX_COMMENTS,
+    weight_by_likes: bool = SUMMARY_WEIGHT_BY_LIKES,
+):
+    """
+    Resumo map-reduce: os comentários são divididos em blocos por tokens,
+    resumidos em paralelo e os resumos parciais são reduzidos em quantos
+    níveis forem necessários. Com um único bloco, equivale a uma só chamada.
+
+    Os blocos seguem a ordem de publicação, então numa re-coleta os comentários
+    novos caem nos últimos blocos e os demais reaproveitam o cache do LLM.
+    """
+    comments = [c for c in analyzed_comments if c.get("translated")]
+    comments.sort(key=lambda c: (c.get("published_at") or "", c.get("comment_id") or ""))
+
+    # Com agrupamento semântico, só os representantes de cada grupo
+    representatives = [c for c in comments if c.get("cluster_representative")]
+    if representatives:
+        comments = representatives
+
+    if max_comments and len(comments) > max_comments:
+        comments = sample_by_likes(comments, max_comments)
+
+    def annotate(c):
+        notes = []
+        if representatives:
+            notes.append(f"{c.get('cluster_size', 1)} comentários semelhantes")
+        if weight_by_likes:
+            notes.append(f"{c.get('like_count') or 0} curtidas")
+        return f"[{' | '.join(notes)}] {c['translated']}" if notes else c["translated"]
+
+    lines = [annotate(c) for c in comments]
+
+    chunks = chunk_by_tokens(lines, chunk_tokens)
+    if len(chunks) <= 1:
+        return invoke_chain("summary", {"text": chunks[0] if chunks else ""}).strip()
+
+    print(f"📝 Resumo hierárquico: {len(comments)} comentários em {len(chunks)} blocos")
+    partials = asyncio.run(_summarize_all("summary", chunks))
+
+    # Redução: agrupa os resumos parciais até sobrar um só
+    while len(partials) > 1:
+        groups = chunk_by_tokens(partials, reduce_tokens)
+        if len(groups) == len(partials):
+            # cada parcial já ocupa um grupo inteiro: força pares para convergir
+            groups = ["\n\n".join(partials[i:i + 2]) for i in range(0, len(partials), 2)]
+        partials = asyncio.run(_summarize_all("summary_reduce", groups))
+
+    return partials[0]
+
+# ============================================================
+# ÍNDICE DE PALAVRAS-CHAVE
+# ============================================================
+
+KEYWORD_STATS_TOP_K = 200  # quantas keywords ficam gravadas no stats JSON
+KEYWORD_MIN_SINGULAR_LEN = 4  # palavras mais curtas não são singularizadas
+
+_KEYWORD_STRIP = " \t\r\n#\"'`.,;:!?()[]{}<>«»“”‘’"
+
+# Plurais regulares em pt/en, do sufixo mais específico para o mais genérico
+_SINGULAR_RULES = (
+    ("ões", "ão"), ("ães", "ão"), ("ais", "al"), ("éis", "el"), ("eis", "el"),
+    ("óis", "ol"), ("íses", "ís"), ("ns", "m"), ("ies", "y"), ("res", "r"), ("zes", "z"),
+    ("sses", "ss"), ("ches", "ch"), ("shes", "sh"),
+)
+# Regras do português que estragam plurais ingleses ("fans" → "fam", "scores" → "scorr"):
+# só valem para keywords de comentários em PT (ou de idioma desconhecido)
+_PT_ONLY_SUFFIXES = frozenset({"ais", "eis", "ns", "res", "zes"})
+# Plurais que fogem das regras (ou palavras que só parecem plural)
+_SINGULAR_IRREGULAR = {
+    "mães": "mãe", "mais": "mais", "seis": "seis", "reis": "rei",
+    "fáceis": "fácil", "difíceis": "difícil", "úteis": "útil", "fósseis": "fóssil",
+    # anglicismos comuns em comentários em português
+    "fans": "fan", "scores": "score", "covers": "cover",
+}
+
+
+def _strip_accents(text: str) -> str:
+    import unicodedata
+
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _singularize(word: str, portuguese: bool = True) -> str:
+    if word in _SINGULAR_IRREGULAR:
+        return _SINGULAR_IRREGULAR[word]
+    if len(word) < KEYWORD_MIN_SINGULAR_LEN or not word.endswith("s"):
+        return word
+    # Regras específicas antes do corte genérico: "-is"/"-us" de "anais", "papéis"
+    # são plurais, mas "lápis", "tênis" e "vírus" não
+    for suffix, repl in _SINGULAR_RULES:
+        if word.endswith(suffix) and (portuguese or suffix not in _PT_ONLY_SUFFIXES):
+            return word[: -len(suffix)] + repl
+    if word.endswith(("ss", "us", "is")):
+        return word
+    return word[:-1]
+
+
+@functools.lru_cache(maxsize=65536)
+def normalize_keyword(keyword: str, language: str = None):
+    """
+    Normaliza uma keyword para contagem: retorna `(chave, forma_exibida)`.
+    A chave ignora caixa, acentos e plural ("Músicas" e "musica" contam juntas);
+    a forma exibida mantém os acentos. Keywords com várias palavras ficam inteiras.
+    `language` é o idioma do comentário: fora do PT, só as regras de plural seguras.
+    """
+    portuguese = language in (None, "", "pt")
+    words = [_singularize(w, portuguese) for w in keyword.strip(_KEYWORD_STRIP).casefold().split()]
+    display = " ".join(words)
+    return _strip_accents(display), display
+
+
+def split_keywords(value) -> list:
+    """Aceita a string "a, b, c" gravada pelo modelo ou uma lista já separada."""
+    if not value:
+        return []
+    items = value.split(",") if isinstance(value, str) else value
+    return [kw for kw in (str(i).strip() for i in items) if kw]
+
+
+class KeywordIndex:
+    """
+    Contagem de keywords normalizadas, atualizável registro a registro.
+    Cada chave é exibida pela forma acentuada mais frequente.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.forms = {}
+
+    def add(self, keyword: str, count: int = 1, language: str = None):
+        key, display = normalize_keyword(keyword, language)
+        if not key:
+            return
+        self.counts[key] += count
+        self.forms.setdefault(key, Counter())[display] += count
+
+    def update(self, records):
+        for r in records:
+            for kw in split_keywords(r.get("keywords")):
+                self.add(kw, language=r.get("language"))
+
+    def most_common(self, k=None) -> dict:
+        return {self.forms[key].most_common(1)[0][0]: n for key, n in self.counts.most_common(k)}
+
+
+def build_keyword_counts(analyzed_comments, top_k=KEYWORD_STATS_TOP_K) -> dict:
+    index = KeywordIndex()
+    index.update(analyzed_comments)
+    return index.most_common(top_k)
+
+
+def top_keywords(k=20, video_ids=None, root="youtube_comments") -> dict:
+    """
+    Top-K keywords somando os `keyword_counts` já gravados nos
+    stats_resumo_*.json (não relê os comentários analisados).
+    """
+    if video_ids is None:
+        video_ids = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d))) if os.path.isdir(root) else []
+
+    index = KeywordIndex()
+    for vid in video_ids:
+        stats = _load_json_file(f"{root}/{vid}/stats_resumo_{vid}.json", {})
+        for kw, n in stats.get("keyword_counts", {}).items():
+            index.add(kw, n)
+    return index.most_common(k)
+
+
+# ============================================================
+# ESTATÍSTICAS
+# ============================================================
+
+def generate_stats(analyzed_comments, trends=None):
+    """
+    `trends`: `TrendAccumulator` já atualizado (execução incremental); sem ele,
+    as tendências são agregadas de novo a partir dos comentários.
+    """
+    # Caminho de um dataset colunar: conta direto nas colunas, sem montar registros
+    if isinstance(analyzed_comments, str):
+        return columnar_stats(analyzed_comments, trends=trends)
+
+    import pandas as pd
+
+    df = pd.DataFrame(analyzed_comments)
+
+    stats = {
+        "sentiment_counts": df["sentiment"].value_counts().to_dict() if "sentiment" in df else {},
+        "emotion_counts": df["emotion"].value_counts().to_dict() if "emotion" in df else {},
+        "context_counts": df["context"].value_counts().to_dict() if "context" in df else {},
+        "language_counts": df["language"].value_counts().to_dict() if "language" in df else {},
+        "keyword_counts": build_keyword_counts(analyzed_comments),
+        "trends": (trends or TrendAccumulator(cells=trend_cells_from_frame(df))).to_dict(),
+    }
+
+    # retorna somente o dicionário de stats (não grava nada no diretório raiz)
+    return stats
+
+
+# ------------------------------------------------------------
+# Tendências no tempo (published_at) e distribuições por curtidas
+# ------------------------------------------------------------
+
+TREND_FREQ = "W"        # "D" diário, "W" semanal (semanas começam na segunda), "M" mensal
+TREND_ROLLING = 4       # janela móvel, em períodos
+TREND_FIELDS = ("sentiment", "emotion", "context")
+
+
+def period_start(published_at, freq: str = TREND_FREQ):
+    """Início (AAAA-MM-DD) do período de um `published_at` ISO; None se ausente/inválido."""
+    try:
+        day = datetime.strptime(str(published_at)[:10], "%Y-%m-%d")
+    except ValueError:
+        return None
+    if freq == "W":
+        day -= timedelta(days=day.weekday())
+    elif freq == "M":
+        day = day.replace(day=1)
+    return day.strftime("%Y-%m-%d")
+
+
+def _period_range(first: str, last: str, freq: str) -> list:
+    periods = []
+    current, end = datetime.strptime(first, "%Y-%m-%d"), datetime.strptime(last, "%Y-%m-%d")
+    while current <= end:
+        periods.append(current.strftime("%Y-%m-%d"))
+        if freq == "M":
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=7 if freq == "W" else 1)
+    return periods
+
+
+def trend_cells_from_frame(df, freq: str = TREND_FREQ) -> list:
+    """
+    Uma única agregação agrupada (período, idioma, campo, rótulo) → comentários
+    e curtidas, sobre o DataFrame dos comentários analisados.
+    """
+    import pandas as pd
+
+    fields = [f for f in TREND_FIELDS if f in df]
+    if df.empty or not fields:
+        return []
+
+    if "published_at" in df:
+        dates = pd.to_datetime(df["published_at"], utc=True, errors="coerce").dt.tz_localize(None).dt.normalize()
+        if freq == "W":
+            dates = dates - pd.to_timedelta(dates.dt.weekday, unit="D")
+        elif freq == "M":
+            dates = dates.dt.to_period("M").dt.start_time
+        period = dates.dt.strftime("%Y-%m-%d").fillna("")
+    else:
+        period = pd.Series("", index=df.index)
+
+    frame = pd.DataFrame({
+        "period": period,
+        "language": df["language"].fillna("") if "language" in df else "",
+        "likes": pd.to_numeric(df["like_count"], errors="coerce").fillna(0).astype(int) if "like_count" in df else 0,
+    }).join(df[fields])
+
+    long = frame.melt(id_vars=["period", "language", "likes"], value_vars=fields, var_name="field", value_name="label")
+    long = long[long["label"].notna() & (long["label"] != "")]
+    grouped = long.groupby(["period", "language", "field", "label"])["likes"].agg(["size", "sum"]).reset_index()
+
+    return [
+        [period, language, field, label, int(n), int(likes)]
+        for period, language, field, label, n, likes in grouped.itertuples(index=False)
+    ]
+
+
+class TrendAccumulator:
+    """
+    Células (período, idioma, campo, rótulo) → [comentários, curtidas].
+    Séries por período, janela móvel, distribuições ponderadas por curtidas
+    e por idioma são derivadas das células; comentários novos só somam a
+    elas (`update`), e `from_stats` retoma as células gravadas no stats JSON.
+    """
+
+    def __init__(self, freq: str = TREND_FREQ, cells=None):
+        self.freq = freq
+        self.cells = {}
+        for period, language, field, label, n, likes in cells or []:
+            self.add_cell(period, language, field, label, n, likes)
+
+    @classmethod
+    def from_stats(cls, stats: dict):
+        trends = (stats or {}).get("trends") or {}
+        return cls(trends.get("freq", TREND_FREQ), trends.get("cells"))
+
+    def add_cell(self, period, language, field, label, n, likes):
+        key = (period, language, field, label)
+        cell = self.cells.setdefault(key, [0, 0])
+        cell[0] += n
+        cell[1] += likes
+        if cell[0] <= 0:
+            del self.cells[key]
+
+    def update(self, records, sign: int = 1):
+        """Soma os registros às células; `sign=-1` desconta registros substituídos."""
+        for r in records:
+            period = period_start(r.get("published_at"), self.freq) or ""
+            language = r.get("language") or ""
+            likes = int(r.get("like_count") or 0)
+            for field in TREND_FIELDS:
+                if r.get(field):
+                    self.add_cell(period, language, field, r[field], sign, sign * likes)
+
+    def to_dict(self, window: int = TREND_ROLLING) -> dict:
+        dated = sorted({key[0] for key in self.cells if key[0]})
+        periods = _period_range(dated[0], dated[-1], self.freq) if dated else []
+        slot = {p: i for i, p in enumerate(periods)}
+
+        series = {field: {} for field in TREND_FIELDS}
+        weighted = {field: Counter() for field in TREND_FIELDS}
+        by_language = {}
+
+        for (period, language, field, label), (n, likes) in self.cells.items():
+            if field not in series:
+                continue
+            # peso = 1 + curtidas, como na amostragem do resumo
+            weighted[field][label] += n + likes
+            by_language.setdefault(language or "?", {}).setdefault(field, Counter())[label] += n
+            if period in slot:
+                series[field].setdefault(label, [0] * len(periods))[slot[period]] += n
+
+        rolling_share = {}
+        for field, labels in series.items():
+            rolling = {
+                label: [sum(values[max(0, i - window + 1):i + 1]) for i in range(len(values))]
+                for label, values in labels.items()
+            }
+            totals = [sum(col) for col in zip(*rolling.values())] if rolling else []
+            rolling_share[field] = {
+                label: [round(v / t, 4) if t else 0.0 for v, t in zip(values, totals)]
+                for label, values in rolling.items()
+            }
+
+        def shares(counter):
+            total = sum(counter.values())
+            return {label: round(v / total, 4) for label, v in counter.most_common()} if total else {}
+
+        return {
+            "freq": self.freq,
+            "window": window,
+            "periods": periods,
+            "series": series,
+            "rolling_share": rolling_share,
+            "like_weighted": {field: shares(c) for field, c in weighted.items()},
+            "by_language": {
+                language: {field: dict(c.most_common()) for field, c in fields.items()}
+                for language, fields in sorted(by_language.items())
+            },
+            "cells": [[*key, n, likes] for key, (n, likes) in sorted(self.cells.items())],
+        }
+
+
+STATS_FIELDS = ("sentiment", "emotion", "context", "language")
+
+
+class StatsAccumulator:
+    """
+    Estatísticas calculadas online, registro a registro (modo streaming).
+    `to_dict()` tem o mesmo formato de `generate_stats`.
+    """
+
+    def __init__(self):
+        self.counts = {field: Counter() for field in STATS_FIELDS}
+        self.keywords = KeywordIndex()
+        self.trends = TrendAccumulator()
+        self.total = 0
+
+    def update(self, records):
+        records = list(records)
+        for r in records:
+            self.total += 1
+            for field in STATS_FIELDS:
+                if r.get(field) is not None:
+                    self.counts[field][r[field]] += 1
+        self.keywords.update(records)
+        self.trends.update(records)
+
+    def to_dict(self) -> dict:
+        stats = {f"{field}_counts": dict(self.counts[field].most_common()) for field in STATS_FIELDS}
+        stats["keyword_counts"] = self.keywords.most_common(KEYWORD_STATS_TOP_K)
+        stats["trends"] = self.trends.to_dict()
+        return stats
+
+
+# ============================================================
+# SALVAMENTO
+# ============================================================
+
+def save_json(filename, data):
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+def append_jsonl(filename, records):
+    with open(filename, "a", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+def iter_jsonl(filename):
+    with open(filename, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+# ============================================================
+# SAÍDA COLUNAR (Parquet / Arrow IPC)
+# ============================================================
+
+# "parquet", "arrow" (Arrow IPC, lido com memory-map) ou None (só JSON)
+COLUMNAR_FORMAT = os.environ.get("COLUMNAR_FORMAT") or None
+KEEP_JSON_OUTPUT = True  # com saída colunar ativa, False deixa de gravar os .json
+
+# duplicate_group é o comment_id do representante: repetido em todo o grupo, vai como dicionário
+CATEGORICAL_FIELDS = STATS_FIELDS + ("duplicate_group",)
+COLUMNAR_INT_FIELDS = ("like_count", "duplicate_group_size", "cluster", "cluster_size")
+COLUMNAR_BOOL_FIELDS = ("cluster_representative",)
+_COLUMNAR_DATASET_FORMAT = {"parquet": "parquet", "arrow": "ipc"}
+
+
+def columnar_path(base_path: str, fmt=None) -> str:
+    """
+    Diretório do dataset colunar de `<base_path>` (ex.: comentarios_analisados_<ID>.parquet/).
+    Cada gravação incremental acrescenta um arquivo `part-NNNNN` ao diretório.
+    """
+    return f"{base_path}.{fmt or COLUMNAR_FORMAT}"
+
+
+def _columnar_value(value, is_int: bool, is_bool: bool = False):
+    if value is None:
+        return None
+    if is_bool:
+        return bool(value)
+    if is_int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    return value if isinstance(value, str) else str(value)
+
+
+def _columnar_table(records):
+    """Monta a tabela Arrow com as colunas categóricas dicionarizadas."""
+    import pyarrow as pa
+
+    names = list(dict.fromkeys(k for r in records for k in r))
+    fields, columns = [], []
+    for name in names:
+        is_int, is_bool = name in COLUMNAR_INT_FIELDS, name in COLUMNAR_BOOL_FIELDS
+        if name in CATEGORICAL_FIELDS:
+            dtype = pa.dictionary(pa.int32(), pa.string())
+        elif is_bool:
+            dtype = pa.bool_()
+        else:
+            dtype = pa.int64() if is_int else pa.string()
+        fields.append(pa.field(name, dtype))
+        columns.append(pa.array([_columnar_value(r.get(name), is_int, is_bool) for r in records], type=dtype))
+    return pa.Table.from_arrays(columns, schema=pa.schema(fields))
+
+
+def write_columnar(path: str, records, append: bool = False, fmt=None):
+    """
+    Grava `records` no dataset colunar em `path`. Sem `append`, substitui o
+    conteúdo anterior; com `append`, só acrescenta um novo arquivo de partição.
+    """
+    fmt = fmt or COLUMNAR_FORMAT
+    records = list(records)
+
+    if not append and os.path.isdir(path):
+        shutil.rmtree(path)
+    if not records:
+        return path
+    os.makedirs(path, exist_ok=True)
+
+    table = _columnar_table(records)
+    part = f"{path}/part-{len(os.listdir(path)):05d}.{fmt}"
+    tmp = part + ".tmp"
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, tmp, compression="zstd")
+    else:
+        import pyarrow as pa
+
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    os.replace(tmp, part)
+    return path
+
+
+def open_columnar(path: str, fmt=None):
+    """Abre o dataset (sem ler dados); arquivos Arrow IPC são mapeados em memória."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    fmt = fmt or path.rsplit(".", 1)[-1]
+    options = dict(format=_COLUMNAR_DATASET_FORMAT[fmt], filesystem=fs.LocalFileSystem(use_mmap=True))
+    dataset = ds.dataset(path, **options)
+
+    # Partições gravadas em execuções diferentes podem ter colunas diferentes
+    schemas = [frag.physical_schema for frag in dataset.get_fragments()]
+    if len(schemas) > 1:
+        dataset = ds.dataset(path, schema=pa.unify_schemas(schemas), **options)
+    return dataset
+
+
+def read_columnar(path: str, columns=None, fmt=None):
+    """Lê só as `columns` pedidas (as que existirem no dataset) como `pyarrow.Table`."""
+    dataset = open_columnar(path, fmt)
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    return dataset.to_table(columns=columns)
+
+
+def iter_columnar_records(path: str, fmt=None):
+    # Colunas ausentes numa partição voltam como nulos: omitidas, como no JSON
+    for batch in open_columnar(path, fmt).to_batches():
+        for row in batch.to_pylist():
+            yield {k: v for k, v in row.items() if v is not None}
+
+
+def columnar_stats(path: str, fmt=None, trends=None) -> dict:
+    """`generate_stats` lendo apenas as colunas categóricas, de keywords e de tendência."""
+    import pyarrow.compute as pc
+
+    table = read_columnar(path, columns=[*STATS_FIELDS, "keywords"], fmt=fmt)
+
+    stats = {}
+    for field in STATS_FIELDS:
+        counts = {}
+        if field in table.column_names:
+            for item in pc.value_counts(table[field]).to_pylist():
+                if item["values"] is not None:
+                    counts[item["values"]] = item["counts"]
+        stats[f"{field}_counts"] = dict(sorted(counts.items(), key=lambda kv: -kv[1]))
+
+    index = KeywordIndex()
+    if "keywords" in table.column_names:
+        languages = table["language"].to_pylist() if "language" in table.column_names else [None] * table.num_rows
+        for value, language in zip(table["keywords"].to_pylist(), languages):
+            for kw in split_keywords(value):
+                index.add(kw, language=language)
+    stats["keyword_counts"] = index.most_common(KEYWORD_STATS_TOP_K)
+
+    if trends is None:
+        df = read_columnar(path, columns=["published_at", "like_count", "language", *TREND_FIELDS], fmt=fmt).to_pandas()
+        # Colunas dicionarizadas chegam como Categorical; a agregação espera strings
+        df = df.astype({c: object for c in df.columns if str(df[c].dtype) == "category"})
+        trends = TrendAccumulator(cells=trend_cells_from_frame(df))
+    stats["trends"] = trends.to_dict()
+    return stats
+
+
+# ============================================================
+# ÍNDICE ANALÍTICO ENTRE VÍDEOS (SQLite)
+# ============================================================
+
+ANALYTICS_INDEX = True
+ANALYTICS_INDEX_PATH = "youtube_comments/analytics.sqlite"
+INDEX_FIELDS = ("sentiment", "emotion", "context", "language")
+
+# Agrupamentos de período aceitos nas consultas (sobre a coluna `day`)
+INDEX_PERIODS = {
+    "day": "day",
+    "week": "strftime('%Y-W%W', day)",
+    "month": "substr(day, 1, 7)",
+    "all": "'total'",
+}
+
+VIDEO_NOTES = {}  # video_id → "Artista - Título" (comentário da lista de vídeos)
+
+
+def parse_video_note(note: str):
+    """ "Artista - Título" → (artista, título); sem " - ", tudo é título."""
+    note = (note or "").strip()
+    if " - " in note:
+        artist, title = note.split(" - ", 1)
+        return artist.strip(), title.strip()
+    return None, note or None
+
+
+class AnalyticsIndex:
+    """
+    Índice local de todos os vídeos analisados:
+      - comments: um registro por (vídeo, comentário) com dia e rótulos;
+      - label_daily: contagens/curtidas por (vídeo, dia, campo, rótulo);
+      - keyword_totals: contagens de keywords normalizadas por vídeo.
+    As tabelas agregadas são atualizadas por diferença a cada vídeo salvo,
+    então as consultas não relêem nenhum JSON.
+    """
+
+    def __init__(self, path=ANALYTICS_INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            " video_id TEXT PRIMARY KEY, artist TEXT, title TEXT, comments INTEGER, updated_at REAL);"
+            "CREATE TABLE IF NOT EXISTS comments ("
+            " video_id TEXT, comment_id TEXT, day TEXT, like_count INTEGER,"
+            " sentiment TEXT, emotion TEXT, context TEXT, language TEXT, keywords TEXT,"
+            " PRIMARY KEY (video_id, comment_id));"
+            "CREATE INDEX IF NOT EXISTS comments_day ON comments (day);"
+            "CREATE TABLE IF NOT EXISTS label_daily ("
+            " video_id TEXT, day TEXT, field TEXT, label TEXT, n INTEGER, likes INTEGER,"
+            " PRIMARY KEY (video_id, day, field, label));"
+            "CREATE TABLE IF NOT EXISTS keyword_totals ("
+            " video_id TEXT, keyword TEXT, n INTEGER, PRIMARY KEY (video_id, keyword));"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _row(record: dict) -> tuple:
+        keywords = sorted({
+            normalize_keyword(kw, record.get("language"))[1] for kw in split_keywords(record.get("keywords"))
+        } - {""})
+        return (
+            (record.get("published_at") or "")[:10],
+            int(record.get("like_count") or 0),
+            *(record.get(field) for field in INDEX_FIELDS),
+            "|".join(keywords),
+        )
+
+    def update_video(self, video_id: str, analyzed, artist: str = None, title: str = None) -> int:
+        """
+        Sincroniza o vídeo com `analyzed` (o conjunto completo): comentários
+        novos/alterados entram, removidos saem, e os agregados recebem só a
+        diferença. Retorna quantos comentários mudaram.
+        """
+        new = {r["comment_id"]: self._row(r) for r in analyzed if isinstance(r, dict) and r.get("comment_id")}
+
+        with self._lock, self._conn:
+            old = {
+                row[0]: tuple(row[1:]) for row in self._conn.execute(
+                    "SELECT comment_id, day, like_count, sentiment, emotion, context, language, keywords"
+                    " FROM comments WHERE video_id = ?", (video_id,)
+                )
+            }
+
+            labels, likes, keywords = Counter(), Counter(), Counter()
+
+            def account(row, sign):
+                day, like_count, *fields, kws = row
+                for field, label in zip(INDEX_FIELDS, fields):
+                    if label:
+                        labels[(day, field, label)] += sign
+                        likes[(day, field, label)] += sign * like_count
+                for kw in filter(None, kws.split("|")):
+                    keywords[kw] += sign
+
+            removed = [cid for cid in old if cid not in new]
+            changed = [cid for cid, row in new.items() if old.get(cid) != row]
+            for cid in removed:
+                account(old[cid], -1)
+            for cid in changed:
+                if cid in old:
+                    account(old[cid], -1)
+                account(new[cid], +1)
+
+            self._conn.executemany(
+                "DELETE FROM comments WHERE video_id = ? AND comment_id = ?",
+                [(video_id, cid) for cid in removed],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO comments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(video_id, cid, *new[cid]) for cid in changed],
+            )
+            self._conn.executemany(
+                "INSERT INTO label_daily VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (video_id, day, field, label)"
+                " DO UPDATE SET n = n + excluded.n, likes = likes + excluded.likes",
+                [(video_id, day, field, label, n, likes[(day, field, label)])
+                 for (day, field, label), n in labels.items() if n or likes[(day, field, label)]],
+            )
+            self._conn.executemany(
+                "INSERT INTO keyword_totals VALUES (?, ?, ?)"
+                " ON CONFLICT (video_id, keyword) DO UPDATE SET n = n + excluded.n",
+                [(video_id, kw, n) for kw, n in keywords.items() if n],
+            )
+            self._conn.execute("DELETE FROM label_daily WHERE video_id = ? AND n <= 0", (video_id,))
+            self._conn.execute("DELETE FROM keyword_totals WHERE video_id = ? AND n <= 0", (video_id,))
+
+            if artist is None and title is None:
+                artist, title = parse_video_note(VIDEO_NOTES.get(video_id))
+            self._conn.execute(
+                "INSERT INTO videos VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (video_id) DO UPDATE SET"
+                " artist = COALESCE(excluded.artist, artist), title = COALESCE(excluded.title, title),"
+                " comments = excluded.comments, updated_at = excluded.updated_at",
+                (video_id, artist, title, len(new), time.time()),
+            )
+
+        return len(removed) + len(changed)
+
+    def query(self, sql: str, params=()) -> list:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def videos(self) -> list:
+        return self.query("SELECT * FROM videos ORDER BY artist, title, video_id")
+
+    def label_distribution(self, field: str = "sentiment", period: str = "week",
+                           video_id: str = None, artist: str = None, by_artist: bool = False) -> list:
+        """
+        Distribuição de `field` por vídeo (ou artista) e por período
+        (day/week/month/all), com total de curtidas de cada rótulo.
+        """
+        if field not in INDEX_FIELDS:
+            raise ValueError(f"campo inválido: {field} (use um de {INDEX_FIELDS})")
+        if period not in INDEX_PERIODS:
+            raise ValueError(f"período inválido: {period} (use um de {tuple(INDEX_PERIODS)})")
+
+        group = "COALESCE(v.artist, l.video_id)" if by_artist else "l.video_id"
+        where, params = ["l.field = ?"], [field]
+        if video_id:
+            where.append("l.video_id = ?")
+            params.append(video_id)
+        if artist:
+            where.append("v.artist = ?")
+            params.append(artist)
+
+        return self.query(
+            f"SELECT {group} AS grupo, {INDEX_PERIODS[period]} AS periodo, l.label AS rotulo,"
+            f" SUM(l.n) AS n, SUM(l.likes) AS curtidas"
+            f" FROM label_daily l LEFT JOIN videos v ON v.video_id = l.video_id"
+            f" WHERE {' AND '.join(where)}"
+            f" GROUP BY grupo, periodo, rotulo ORDER BY grupo, periodo, n DESC",
+            params,
+        )
+
+    def top_keywords(self, k: int = 10, by_artist: bool = False, video_id: str = None, artist: str = None) -> list:
+        """Top-K keywords por vídeo (ou por artista)."""
+        group = "COALESCE(v.artist, t.video_id)" if by_artist else "t.video_id"
+        where, params = [], []
+        if video_id:
+            where.append("t.video_id = ?")
+            params.append(video_id)
+        if artist:
+            where.append("v.artist = ?")
+            params.append(artist)
+
+        return self.query(
+            f"SELECT grupo, keyword, n FROM ("
+            f" SELECT {group} AS grupo, t.keyword AS keyword, SUM(t.n) AS n,"
+            f" ROW_NUMBER() OVER (PARTITION BY {group} ORDER BY SUM(t.n) DESC, t.keyword) AS pos"
+            f" FROM keyword_totals t LEFT JOIN videos v ON v.video_id = t.video_id"
+            f" {'WHERE ' + ' AND '.join(where) if where else ''}"
+            f" GROUP BY grupo, t.keyword"
+            f") WHERE pos <= ? ORDER BY grupo, n DESC",
+            [*params, k],
+        )
+
+    def rebuild(self, root: str = "youtube_comments") -> int:
+        """Reindexa todos os vídeos já salvos em `root` (ex.: índice novo ou apagado)."""
+        count = 0
+        for vid in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+            if vid.startswith(".") or not os.path.isdir(f"{root}/{vid}"):
+                continue
+            records = _load_records(f"{root}/{vid}/comentarios_analisados_{vid}")
+            if records:
+                self.update_video(vid, records)
+                count += 1
+        return count
+
+
+_ANALYTICS_INDEX = None
+_ANALYTICS_LOCK = threading.Lock()
+
+
+def get_analytics_index():
+    """Índice aberto no primeiro uso (None se desativado)."""
+    global _ANALYTICS_INDEX
+    if not ANALYTICS_INDEX:
+        return None
+    with _ANALYTICS_LOCK:
+        if _ANALYTICS_INDEX is None:
+            _ANALYTICS_INDEX = AnalyticsIndex(ANALYTICS_INDEX_PATH)
+        return _ANALYTICS_INDEX
+
+
+def index_video(video_id: str, analyzed):
+    index = get_analytics_index()
+    if index is not None:
+        changed = index.update_video(video_id, analyzed)
+        print(f"🗂 Índice analítico atualizado ({changed} comentários alterados)")
+
+
+def _print_rows(rows):
+    if not rows:
+        print("(nenhum resultado)")
+        return
+    names = list(rows[0])
+    widths = [max(len(str(n)), *(len(str(r[n])) for r in rows)) for n in names]
+    print("  ".join(str(n).ljust(w) for n, w in zip(names, widths)))
+    for r in rows:
+        print("  ".join(str(r[n]).ljust(w) for n, w in zip(names, widths)))
+
+
+def analytics_cli(argv) -> int:
+    """
+    Consultas ao índice analítico, ex.:
+      python main.py analytics labels --field emotion --period week
+      python main.py analytics keywords --by-artist -k 5
+      python main.py analytics rebuild
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="main.py analytics", description="Consultas ao índice analítico")
+    parser.add_argument("--db", default=ANALYTICS_INDEX_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("videos", help="vídeos indexados")
+    sub.add_parser("rebuild", help="reindexa youtube_comments/")
+
+    labels = sub.add_parser("labels", help="distribuição de rótulos por período")
+    labels.add_argument("--field", default="sentiment", choices=INDEX_FIELDS)
+    labels.add_argument("--period", default="week", choices=tuple(INDEX_PERIODS))
+
+    keywords = sub.add_parser("keywords", help="top keywords")
+    keywords.add_argument("-k", type=int, default=10)
+
+    for p in (labels, keywords):
+        p.add_argument("--video")
+        p.add_argument("--artist")
+        p.add_argument("--by-artist", action="store_true")
+
+    args = parser.parse_args(argv)
+    index = AnalyticsIndex(args.db)
+
+    if args.command == "videos":
+        _print_rows(index.videos())
+    elif args.command == "rebuild":
+        print(f"🗂 {index.rebuild()} vídeos indexados")
+    elif args.command == "labels":
+        _print_rows(index.label_distribution(
+            args.field, args.period, video_id=args.video, artist=args.artist, by_artist=args.by_artist
+        ))
+    else:
+        _print_rows(index.top_keywords(args.k, by_artist=args.by_artist, video_id=args.video, artist=args.artist))
+    return 0
+
+
+def save_outputs_for_video(video_id, comments, analyzed, resumo, stats):
+    base_dir = f"youtube_comments/{video_id}"
+    os.makedirs(base_dir, exist_ok=True)
+
+    # Arquivos JSON essenciais
+    if KEEP_JSON_OUTPUT or not COLUMNAR_FORMAT:
+        save_json(f"{base_dir}/comentarios_youtube_{video_id}.json", comments)
+        save_json(f"{base_dir}/comentarios_analisados_{video_id}.json", analyzed)
+
+    if COLUMNAR_FORMAT:
+        write_columnar(columnar_path(f"{base_dir}/comentarios_youtube_{video_id}"), comments)
+        write_columnar(columnar_path(f"{base_dir}/comentarios_analisados_{video_id}"), analyzed)
+
+    # Estatísticas (mantém JSON)
+    with open(f"{base_dir}/stats_resumo_{video_id}.json", "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=4, ensure_ascii=False)
+
+    index_video(video_id, analyzed)
+
+
+# ============================================================
+# ASSETS DO RELATÓRIO (thumbnail, wordcloud, gráficos) COM CACHE
+# ============================================================
+
+THUMBNAIL_MIN_BYTES = 1000
+
+_HTTP_SESSION = None
+_HTTP_LOCK = threading.Lock()
+
+
+def http_session():
+    """Sessão HTTP compartilhada (pool de conexões reaproveitado entre downloads)."""
+    global _HTTP_SESSION
+
+    with _HTTP_LOCK:
+        if _HTTP_SESSION is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _HTTP_SESSION = session
+        return _HTTP_SESSION
+
+
+def _load_json_file(path, default):
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+    return default
+
+
+def fetch_thumbnail(video_id: str, base_dir: str):
+    """
+    Baixa a thumbnail (maxresdefault e hqdefault em paralelo), com cache em
+    disco revalidado por ETag / If-Modified-Since. Retorna o caminho ou None.
+    """
+    import requests
+
+    thumb_path = f"{base_dir}/thumbnail_{video_id}.jpg"
+    meta_path = f"{base_dir}/thumbnail_{video_id}.meta.json"
+    meta = _load_json_file(meta_path, {}) if os.path.exists(thumb_path) else {}
+
+    urls = [
+        f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",
+        f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
+    ]
+
+    def fetch(url):
+        headers = {}
+        if meta.get("url") == url:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            return http_session().get(url, headers=headers, timeout=10)
+        except requests.RequestException as e:
+            print(f"⚠ Falha ao baixar thumbnail ({url}): {e}")
+            return None
+
+    def store(url, r) -> bool:
+        if r is None or r.status_code != 200 or len(r.content) <= THUMBNAIL_MIN_BYTES:
+            return False
+        with open(thumb_path, "wb") as img:
+            img.write(r.content)
+        save_json(meta_path, {
+            "url": url,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+        })
+        return True
+
+    # Já em cache: revalida só a variante salva. 304 dispensa o download;
+    # 200 já traz a imagem nova (e o novo ETag), que é gravada sem baixar de novo
+    if meta.get("url") in urls:
+        r = fetch(meta["url"])
+        if r is not None and r.status_code == 304:
+            return thumb_path
+        if store(meta["url"], r):
+            return thumb_path
+
+    with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+        responses = list(pool.map(fetch, urls))
+
+    # Preferência pela maior resolução disponível
+    for url, r in zip(urls, responses):
+        if r is not None and r.status_code == 304 and meta.get("url") == url:
+            return thumb_path
+        if store(url, r):
+            return thumb_path
+
+    return None
+
+
+def _asset_is_current(base_dir: str, asset_path: str, data) -> tuple:
+    """
+    Compara o hash das entradas de um asset com o registrado na última
+    renderização. Retorna (atualizado?, hash).
+    """
+    digest = hashlib.sha256(
+        json.dumps(data, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    registry = _load_json_file(f"{base_dir}/.assets.json", {})
+    current = os.path.exists(asset_path) and registry.get(os.path.basename(asset_path)) == digest
+    return current, digest
+
+
+def _register_asset(base_dir: str, asset_path: str, digest: str):
+    registry_path = f"{base_dir}/.assets.json"
+    registry = _load_json_file(registry_path, {})
+    registry[os.path.basename(asset_path)] = digest
+    save_json(registry_path, registry)
+
+
+def render_wordcloud(keyword_counts: dict, path: str) -> str:
+    """
+    Renderiza a nuvem de palavras a partir das frequências já contadas
+    (keywords compostas ficam inteiras); só refaz a imagem se elas mudaram.
+    """
+    base_dir = os.path.dirname(path)
+    current, digest = _asset_is_current(base_dir, path, {"wordcloud": sorted(keyword_counts.items())})
+    if current:
+        return path
+
+    from wordcloud import WordCloud
+
+    wc = WordCloud(width=800, height=400, background_color="white")
+    if keyword_counts:
+        wc.generate_from_frequencies(keyword_counts)
+    else:
+        wc.generate("vazio")
+    wc.to_file(path)
+    _register_asset(base_dir, path, digest)
+    return path
+
+
+def render_bar_chart(counts: dict, title: str, path: str) -> str:
+    """Gráfico de barras memoizado pelo hash das contagens."""
+    base_dir = os.path.dirname(path)
+    current, digest = _asset_is_current(base_dir, path, {"bar": counts, "title": title})
+    if current:
+        return path
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(6, 3))
+    plt.bar(counts.keys(), counts.values())
+    plt.title(title)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+    _register_asset(base_dir, path, digest)
+    return path
+
+
+def render_trend_chart(trends: dict, field: str, title: str, path: str):
+    """
+    Participação de cada rótulo na janela móvel, período a período, a partir
+    das tendências já gravadas no stats. None se houver menos de dois períodos.
+    """
+    periods = trends.get("periods") or []
+    shares = (trends.get("rolling_share") or {}).get(field) or {}
+    if len(periods) < 2 or not shares:
+        return None
+
+    base_dir = os.path.dirname(path)
+    current, digest = _asset_is_current(base_dir, path, {"trend": shares, "periods": periods, "title": title})
+    if current:
+        return path
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(6, 3))
+    for label, values in shares.items():
+        plt.plot(range(len(periods)), values, label=label, linewidth=1.5)
+    step = max(1, len(periods) // 8)
+    plt.xticks(range(0, len(periods), step), periods[::step], rotation=30, fontsize=7)
+    plt.ylim(0, 1)
+    plt.title(title)
+    plt.legend(fontsize=7, loc="upper left", ncol=2)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+    _register_asset(base_dir, path, digest)
+    return path
+
+
+# ============================================================
+# RELATÓRIO PDF
+# ============================================================
+
+PDF_MAX_COMMENTS = 300            # comentários no corpo do PDF (None = todos)
+PDF_SAMPLES_PER_CATEGORY = 10     # amostra mínima por contexto e por sentimento
+PDF_COMMENT_CHUNK = 25            # comentários por bloco (Paragraph) no PDF
+
+APPENDIX_FIELDS = (
+    "comment_id", "author", "published_at", "like_count", "language",
+    "sentiment", "emotion", "context", "keywords", "text", "translated", "comment_url",
+    "cluster",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _report_styles():
+    # Criados uma vez por processo e reaproveitados em todos os relatórios
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle("CommentBlock", parent=styles["BodyText"], spaceAfter=6, leading=13))
+    return styles
+
+
+def select_report_comments(
+    analyzed,
+    max_comments: int = PDF_MAX_COMMENTS,
+    per_category: int = PDF_SAMPLES_PER_CATEGORY,
+):
+    """
+    Política de amostragem para o corpo do PDF: os mais curtidos de cada
+    contexto e de cada sentimento (até `per_category`), completados pelos
+    mais curtidos no geral até `max_comments`. Mantém a ordem original.
+    Retorna (posições_escolhidas, total).
+    """
+    total = len(analyzed)
+
+    # Agrupamento semântico: o corpo mostra os representantes de cada grupo
+    representatives = [i for i, c in enumerate(analyzed) if c.get("cluster_representative")]
+    if representatives:
+        if max_comments and len(representatives) > max_comments:
+            representatives.sort(key=lambda i: analyzed[i].get("cluster", 0))
+            representatives = sorted(representatives[:max_comments])
+        return representatives, total
+
+    if not max_comments or total <= max_comments:
+        return list(range(total)), total
+
+    by_likes = sorted(range(total), key=lambda i: -(analyzed[i].get("like_count") or 0))
+    chosen = set()
+
+    for field in ("context", "sentiment"):
+        taken = Counter()
+        for i in by_likes:
+            label = analyzed[i].get(field)
+            if taken[label] < per_category and len(chosen) < max_comments:
+                taken[label] += 1
+                chosen.add(i)
+
+    for i in by_likes:
+        if len(chosen) >= max_comments:
+            break
+        chosen.add(i)
+
+    return sorted(chosen), total
+
+
+def write_comment_appendix(video_id, analyzed) -> str:
+    """Lista completa de comentários analisados em CSV (gravada em fluxo)."""
+    path = f"youtube_comments/{video_id}/comentarios_apendice_{video_id}.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=APPENDIX_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for c in analyzed:
+            writer.writerow(c)
+    return path
+
+
+def _comment_blocks(analyzed, positions, chunk_size: int = PDF_COMMENT_CHUNK):
+    """Gera o texto dos comentários em blocos de `chunk_size` (um Paragraph por bloco)."""
+    for start in range(0, len(positions), chunk_size):
+        parts = []
+        for pos in positions[start:start + chunk_size]:
+            c = analyzed[pos]
+            text = html.escape(c.get("translated") or c.get("text") or "", quote=False)
+            lang = c.get("language", "")
+            parts.append(
+                f"<b>{pos + 1}.</b> "
+                f"{f'[{lang}] ' if lang else ''}{text}"
+                f"<br/><i>Sentimento:</i> {c.get('sentiment', '—')} | "
+                f"<i>Emoção:</i> {c.get('emotion', '—')} | "
+                f"<i>Contexto:</i> {c.get('context', '—')}"
+                + (f" | <i>Grupo:</i> {c['cluster'] + 1} ({c.get('cluster_size', 1)} comentários)" if "cluster" in c else "")
+            )
+        yield "<br/><br/>".join(parts)
+
+
+def generate_pdf_report(video_id, resumo, stats, analyzed, order_used):
+    from reportlab.platypus import (
+        SimpleDocTemplate,
+        Paragraph,
+        Spacer,
+        Table,
+        TableStyle,
+        Image
+    )
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+
+    inicio_pdf = time.perf_counter()
+    base_dir = f"youtube_comments/{video_id}"
+    os.makedirs(base_dir, exist_ok=True)
+
+    file_path = f"{base_dir}/relatorio_{video_id}.pdf"
+
+    # Document settings
+    doc = SimpleDocTemplate(
+        file_path,
+        pagesize=A4,
+        title=f"Relatório de Análise - {video_id}",
+        leftMargin=40,
+        rightMargin=40,
+        topMargin=40,
+        bottomMargin=40,
+    )
+
+    styles = _report_styles()
+    story = []
+
+    # =============================
+    # THUMBNAIL DO VÍDEO
+    # =============================
+    story.append(Paragraph("<b>Capa do Vídeo</b>", styles["Heading2"]))
+    story.append(Spacer(1, 6))
+
+    thumb_path = fetch_thumbnail(video_id, base_dir)
+
+    if thumb_path:
+        try:
+            img = Image(thumb_path)
+            img._restrictSize(450, 250)
+            story.append(img)
+            story.append(Spacer(1, 20))
+        except Exception as e:
+            print(f"⚠ Erro ao inserir thumbnail no PDF: {e}")
+    else:
+        story.append(Paragraph("<i>Thumbnail não disponível</i>", styles["BodyText"]))
+        story.append(Spacer(1, 20))
+
+    # =============================
+    # TÍTULO + LINK + ORDEM
+    # =============================
+    story.append(Paragraph(
+        f"<b>Relatório de Análise de Comentários – Vídeo {video_id}</b>",
+        styles["Title"]
+    ))
+    story.append(Spacer(1, 12))
+
+    video_url = f"https://www.youtube.com/watch?v={video_id}"
+    story.append(Paragraph(f'<a href="{video_url}">{video_url}</a>', styles["BodyText"]))
+    story.append(Spacer(1, 10))
+
+    story.append(Paragraph(
+        f"<i>Ordem de coleta dos comentários: <b>{order_used}</b></i>",
+        styles["BodyText"]
+    ))
+    story.append(Spacer(1, 20))
+
+    # =============================
+    # RESUMO FINAL
+    # =============================
+    story.append(Paragraph("<b>Resumo Geral</b>", styles["Heading2"]))
+    story.append(Spacer(1, 6))
+    story.append(Paragraph(resumo, styles["BodyText"]))
+    story.append(Spacer(1, 20))
+
+    # =============================
+    # ESTATÍSTICAS
+    # =============================
+    story.append(Paragraph("<b>Estatísticas de Comentários</b>", styles["Heading2"]))
+    story.append(Spacer(1, 6))
 
     def fmt_counts(d):
         return "—" if not d else ", ".join([f"{k}: {v}" for k, v in d.items()])
@@ -687,6 +4301,26 @@ def generate_pdf_report(video_id, resumo, stats, analyzed, order_used):
         ["Emoções", fmt_counts(stats.get("emotion_counts", {}))],
         ["Contextos", fmt_counts(stats.get("context_counts", {}))],
         ["Idiomas", fmt_counts(stats.get("language_counts", {}))],
+        ["Palavras-chave", fmt_counts(dict(list(stats.get("keyword_counts", {}).items())[:10]))],
+    ]
+
+    trends = stats.get("trends") or {}
+    if trends.get("like_weighted", {}).get("sentiment"):
+        stats_table.append([
+            "Sentimentos (peso por curtidas)",
+            fmt_counts({k: f"{v:.0%}" for k, v in trends["like_weighted"]["sentiment"].items()}),
+        ])
+    if len(trends.get("by_language") or {}) > 1:
+        stats_table.append([
+            "Sentimentos por idioma",
+            "; ".join(
+                f"{lang}: {fmt_counts(fields.get('sentiment', {}))}"
+                for lang, fields in trends["by_language"].items()
+            ),
+        ])
+    stats_table = [
+        [label, Paragraph(html.escape(value), styles["BodyText"]) if i else value]
+        for i, (label, value) in enumerate(stats_table)
     ]
 
     table = Table(stats_table, colWidths=[130, 350])
@@ -702,23 +4336,46 @@ def generate_pdf_report(video_id, resumo, stats, analyzed, order_used):
     story.append(table)
     story.append(Spacer(1, 20))
 
+    # =============================
+    # GRUPOS SEMÂNTICOS
+    # =============================
+    clusters = stats.get("clusters") or []
+    if clusters:
+        story.append(Paragraph("<b>Grupos de Comentários Semelhantes</b>", styles["Heading2"]))
+        story.append(Spacer(1, 6))
+
+        cluster_rows = [["Grupo", "Comentários", "Curtidas", "Sentimentos", "Palavras-chave"]]
+        for cl in clusters:
+            cluster_rows.append([
+                str(cl["cluster"] + 1),
+                str(cl["size"]),
+                str(cl["likes"]),
+                Paragraph(html.escape(fmt_counts(cl.get("sentiment_counts", {}))), styles["BodyText"]),
+                Paragraph(html.escape(", ".join(cl.get("top_keywords", [])) or "—"), styles["BodyText"]),
+            ])
+
+        cluster_table = Table(cluster_rows, colWidths=[40, 70, 60, 140, 170], repeatRows=1)
+        cluster_table.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#4B5563")),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ("BACKGROUND", (0, 1), (-1, -1), colors.whitesmoke),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.black),
+        ]))
+        story.append(cluster_table)
+        story.append(Spacer(1, 20))
+
     # =============================
     # GERA WORDCLOUD
     # =============================
     story.append(Paragraph("<b>Nuvem de Palavras (Keywords)</b>", styles["Heading2"]))
     story.append(Spacer(1, 6))
 
-    all_keywords = []
-    for c in analyzed:
-        if c.get("keywords"):
-            for kw in c["keywords"].split(","):
-                all_keywords.append(kw.strip())
+    keyword_counts = stats.get("keyword_counts") or build_keyword_counts(analyzed)
 
-    wc_text = " ".join(all_keywords) if all_keywords else "vazio"
-
-    wc = WordCloud(width=800, height=400, background_color="white").generate(wc_text)
-    wc_path = f"{base_dir}/wordcloud_{video_id}.png"
-    wc.to_file(wc_path)
+    wc_path = render_wordcloud(keyword_counts, f"{base_dir}/wordcloud_{video_id}.png")
 
     story.append(Image(wc_path, width=400, height=200))
     story.append(Spacer(1, 20))
@@ -729,39 +4386,62 @@ def generate_pdf_report(video_id, resumo, stats, analyzed, order_used):
     story.append(Paragraph("<b>Distribuição de Contextos</b>", styles["Heading2"]))
     story.append(Spacer(1, 6))
 
-    context_counts = stats.get("context_counts", {})
-
-    plt.figure(figsize=(6, 3))
-    plt.bar(context_counts.keys(), context_counts.values())
-    plt.title("Contextos dos Comentários")
-    plt.tight_layout()
-
-    ctx_path = f"{base_dir}/context_chart_{video_id}.png"
-    plt.savefig(ctx_path)
-    plt.close()
+    ctx_path = render_bar_chart(
+        stats.get("context_counts", {}),
+        "Contextos dos Comentários",
+        f"{base_dir}/context_chart_{video_id}.png"
+    )
 
     story.append(Image(ctx_path, width=400, height=200))
     story.append(Spacer(1, 20))
 
     # =============================
-    # LISTA COMPLETA DE COMENTÁRIOS
+    # TENDÊNCIAS NO TEMPO
     # =============================
-    story.append(Paragraph("<b>Lista Completa de Comentários</b>", styles["Heading2"]))
-    story.append(Spacer(1, 10))
+    window_label = {"D": "dias", "W": "semanas", "M": "meses"}.get(trends.get("freq"), "períodos")
+    trend_paths = [
+        render_trend_chart(trends, field, title, f"{base_dir}/trend_{field}_{video_id}.png")
+        for field, title in (("sentiment", "Sentimentos"), ("emotion", "Emoções"))
+    ]
+    if any(trend_paths):
+        story.append(Paragraph("<b>Tendências ao Longo do Tempo</b>", styles["Heading2"]))
+        story.append(Spacer(1, 6))
+        story.append(Paragraph(
+            f"<i>Participação de cada rótulo na janela móvel de {trends.get('window')} {window_label}, "
+            f"pela data de publicação dos comentários.</i>",
+            styles["BodyText"]
+        ))
+        story.append(Spacer(1, 6))
+        for trend_path in filter(None, trend_paths):
+            story.append(Image(trend_path, width=400, height=200))
+            story.append(Spacer(1, 12))
+        story.append(Spacer(1, 8))
 
-    for idx, c in enumerate(analyzed, start=1):
-        text = c.get("translated") or c.get("text") or ""
-        lang = c.get("language", "")
+    # =============================
+    # LISTA COMPLETA DE COMENTÁRIOS
+    # =============================
+    positions, total = select_report_comments(analyzed)
 
-        block = (
-            f"<b>{idx}.</b> "
-            f"{f'[{lang}] ' if lang else ''}{text}"
-            f"<br/><i>Sentimento:</i> {c.get('sentiment', '—')} | "
-            f"<i>Emoção:</i> {c.get('emotion', '—')} | "
-            f"<i>Contexto:</i> {c.get('context', '—')}"
-        )
-        story.append(Paragraph(block, styles["BodyText"]))
+    if len(positions) == total:
+        story.append(Paragraph("<b>Lista Completa de Comentários</b>", styles["Heading2"]))
+    else:
+        # Amostra no corpo; a lista completa vai para o apêndice em CSV
+        appendix_path = write_comment_appendix(video_id, analyzed)
+        story.append(Paragraph("<b>Comentários em Destaque</b>", styles["Heading2"]))
         story.append(Spacer(1, 6))
+        criterion = (
+            "representantes de cada grupo semântico, ponderados por curtidas" if clusters
+            else "mais curtidos e amostras por contexto/sentimento"
+        )
+        story.append(Paragraph(
+            f"<i>Amostra de {len(positions)} de {total} comentários ({criterion}). "
+            f"Lista completa em {os.path.basename(appendix_path)}.</i>",
+            styles["BodyText"]
+        ))
+    story.append(Spacer(1, 10))
+
+    for block in _comment_blocks(analyzed, positions):
+        story.append(Paragraph(block, styles["CommentBlock"]))
 
     story.append(Spacer(1, 20))
 
@@ -781,14 +4461,516 @@ def generate_pdf_report(video_id, resumo, stats, analyzed, order_used):
 
     # FINALIZA PDF
     doc.build(story)
-    print(f"📄 PDF gerado: {file_path}")
+    build_seconds = time.perf_counter() - inicio_pdf
+    print(f"📄 PDF gerado: {file_path} ({build_seconds:.2f}s)")
+
+    return build_seconds
+
+# ============================================================
+# CHECKPOINT POR VÍDEO E ANÁLISE INCREMENTAL
+# ============================================================
+
+# Re-coletas agendadas: analisa só comentários novos/editados e mescla com o
+# conjunto já analisado do vídeo
+INCREMENTAL_ANALYSIS = False
+
+
+def _load_records(base_path):
+    """Lê `<base_path>.jsonl`, o dataset colunar ou `<base_path>.json` (o que existir)."""
+    if COLUMNAR_FORMAT and os.path.isdir(columnar_path(base_path)):
+        return list(iter_columnar_records(columnar_path(base_path)))
+    if os.path.exists(base_path + ".jsonl"):
+        return list(iter_jsonl(base_path + ".jsonl"))
+    if os.path.exists(base_path + ".json"):
+        with open(base_path + ".json", encoding="utf-8") as f:
+            return json.load(f)
+    return []
+
+
+class AnalysisCheckpoint:
+    """
+    Registro, por vídeo, dos comentários já analisados
+    (youtube_comments/<VIDEO_ID>/checkpoint_analise_<VIDEO_ID>.jsonl).
+
+    Cada comentário concluído é anexado imediatamente; se a execução cair,
+    a próxima pula tudo o que já está no checkpoint. Com `incremental=True`,
+    os resultados salvos da execução anterior também contam como concluídos,
+    e um comentário só é reanalisado se for novo ou se o texto mudou.
+    """
+
+    def __init__(self, video_id: str, incremental: bool = INCREMENTAL_ANALYSIS):
+        self.base_dir = f"youtube_comments/{video_id}"
+        os.makedirs(self.base_dir, exist_ok=True)
+        self.path = f"{self.base_dir}/checkpoint_analise_{video_id}.jsonl"
+        self.video_id = video_id
+        self.done = {}
+        self.previous = {}         # comment_id → registro salvo na execução anterior
+        self.previous_raw = []
+        self.previous_ids = []
+
+        if incremental:
+            self.previous_raw = _load_records(f"{self.base_dir}/comentarios_youtube_{video_id}")
+            for r in _load_records(f"{self.base_dir}/comentarios_analisados_{video_id}"):
+                if r.get("comment_id"):
+                    # Os grupos da execução anterior não valem para o novo conjunto;
+                    # são refeitos (ou omitidos, se o agrupamento não rodar)
+                    for field in CLUSTER_FIELDS:
+                        r.pop(field, None)
+                    self.done[r["comment_id"]] = r
+                    self.previous[r["comment_id"]] = r
+                    self.previous_ids.append(r["comment_id"])
+
+        resumed = 0
+        if os.path.exists(self.path):
+            for r in iter_jsonl(self.path):
+                self.done[r["comment_id"]] = r
+                resumed += 1
+        if resumed:
+            print(f"↩ Checkpoint de análise encontrado: {resumed} comentários já analisados")
+
+        self._file = None  # aberto no primeiro registro
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def is_current(self, c) -> bool:
+        record = self.done.get(c.get("comment_id"))
+        return record is not None and record.get("text") == c.get("text")
+
+    def pending(self, comments) -> list:
+        return [c for c in comments if not self.is_current(c)]
+
+    def record(self, enriched: dict):
+        if not enriched.get("comment_id"):
+            return
+        self.done[enriched["comment_id"]] = enriched
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(enriched, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def merge(self, comments, include_previous: bool = True) -> list:
+        """
+        Registros analisados dos comentários atuais (na ordem da coleta),
+        seguidos — no modo incremental — dos já analisados que não vieram
+        nesta coleta.
+        """
+        current = [self.done[c["comment_id"]] for c in comments if c.get("comment_id") in self.done]
+        if not include_previous:
+            return current
+        return current + self.previous_records(c["comment_id"] for c in comments)
+
+    def previous_records(self, seen_ids) -> list:
+        seen = set(seen_ids)
+        return [self.done[cid] for cid in self.previous_ids if cid not in seen]
+
+    def merge_raw(self, comments) -> list:
+        seen = {c.get("comment_id") for c in comments}
+        return list(comments) + [c for c in self.previous_raw if c.get("comment_id") not in seen]
+
+    def changes(self, analyzed):
+        """(registros novos ou reanalisados, registros anteriores que saíram ou foram substituídos)."""
+        current = {r.get("comment_id"): r for r in analyzed}
+        added = [r for r in analyzed if self.previous.get(r.get("comment_id")) is not r]
+        removed = [r for cid, r in self.previous.items() if current.get(cid) is not r]
+        return added, removed
+
+    def trends(self, analyzed):
+        """
+        Tendências da execução incremental: retoma as células do stats JSON
+        anterior e aplica só a diferença. None se não houver base compatível.
+        """
+        if not self.previous:
+            return None
+        path = f"{self.base_dir}/stats_resumo_{self.video_id}.json"
+        try:
+            with open(path, encoding="utf-8") as f:
+                previous_stats = json.load(f)
+        except (OSError, ValueError):
+            return None
+        saved = previous_stats.get("trends") or {}
+        if "cells" not in saved or saved.get("freq", TREND_FREQ) != TREND_FREQ:
+            return None
+
+        trends = TrendAccumulator.from_stats(previous_stats)
+        added, removed = self.changes(analyzed)
+        trends.update(removed, sign=-1)
+        trends.update(added)
+        return trends
+
+    def clear(self):
+        """Remove o checkpoint depois que as saídas finais foram gravadas."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ============================================================
+# PIPELINE EM STREAMING (coleta → análise → disco)
+# ============================================================
+
+STREAMING_PIPELINE = False
+STREAM_QUEUE_PAGES = 4     # páginas coletadas aguardando análise (limita a memória)
+
+_END_OF_STREAM = object()
+
+
+STREAM_PUT_TIMEOUT = 0.5  # s; intervalo em que o produtor confere o pedido de parada
+
+
+def _put_page(pages: queue.Queue, item, stop: threading.Event) -> bool:
+    """Enfileira `item`, desistindo se o consumidor pedir parada (fila cheia e abandonada)."""
+    while not stop.is_set():
+        try:
+            pages.put(item, timeout=STREAM_PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce_pages(page_iter, pages: queue.Queue, stop: threading.Event):
+    # Roda em thread própria: a coleta continua enquanto as páginas são analisadas
+    try:
+        for page in page_iter:
+            if not _put_page(pages, page, stop):
+                return
+    except Exception as e:
+        _put_page(pages, e, stop)
+    finally:
+        # Fecha o gerador de páginas (e o estado de paginação) mesmo numa parada antecipada
+        close = getattr(page_iter, "close", None)
+        if close is not None:
+            close()
+        _put_page(pages, _END_OF_STREAM, stop)
+
+
+def run_streaming_pipeline(
+    video_id: str,
+    max_comments: int = 50,
+    order: str = "relevance",
+    include_replies: bool = False,
+    with_pdf: bool = True,
+    incremental: bool = INCREMENTAL_ANALYSIS,
+    pdf_executor=None,
+):
+    """
+    Processa um vídeo em fluxo: cada página coletada é analisada assim que
+    chega e os registros são anexados a arquivos JSONL. As estatísticas são
+    acumuladas online; nada mantém a lista completa de comentários em memória
+    até o resumo/PDF, que releem os JSONL.
+    """
+    base_dir = f"youtube_comments/{video_id}"
+    os.makedirs(base_dir, exist_ok=True)
+
+    raw_path = f"{base_dir}/comentarios_youtube_{video_id}.jsonl"
+    analyzed_path = f"{base_dir}/comentarios_analisados_{video_id}.jsonl"
+
+    # Carregado antes de limpar as saídas: no modo incremental elas são a base
+    with AnalysisCheckpoint(video_id, incremental=incremental) as checkpoint:
+        previous_raw = {c.get("comment_id"): c for c in checkpoint.previous_raw}
+        seen_ids = set()
+
+        for path in (raw_path, analyzed_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+        # Saída colunar: cada página vira uma partição anexada ao dataset
+        columnar = {}
+        if COLUMNAR_FORMAT:
+            columnar = {
+                raw_path: columnar_path(raw_path[: -len(".jsonl")]),
+                analyzed_path: columnar_path(analyzed_path[: -len(".jsonl")]),
+            }
+            for dataset_path in columnar.values():
+                write_columnar(dataset_path, [])
+
+        def append_records(path, records):
+            append_jsonl(path, records)
+            if path in columnar:
+                write_columnar(columnar[path], records, append=True)
+
+        pages = queue.Queue(maxsize=STREAM_QUEUE_PAGES)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=_produce_pages,
+            args=(iter_youtube_comment_pages(video_id, max_comments, order, include_replies), pages, stop),
+            daemon=True,
+        )
+        producer.start()
+
+        stats_acc = StatsAccumulator()
+        collected = 0
+
+        # Somados por vídeo e registrados uma vez, como no pipeline em lote
+        fetch_seconds = analysis_seconds = 0.0
+
+        try:
+            while True:
+                # Espera pela próxima página = tempo de coleta não sobreposto à análise
+                start = time.perf_counter()
+                page = pages.get()
+                fetch_seconds += time.perf_counter() - start
+                if page is _END_OF_STREAM:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+
+                collected += len(page)
+                append_records(raw_path, page)
+                seen_ids.update(c.get("comment_id") for c in page)
+
+                pending = checkpoint.pending(page)
+                if pending:
+                    start = time.perf_counter()
+                    analyze_comments(pending, on_record=checkpoint.record)
+                    analysis_seconds += time.perf_counter() - start
+
+                analyzed = checkpoint.merge(page, include_previous=False)
+                append_records(analyzed_path, analyzed)
+                stats_acc.update(analyzed)
+
+                print(f"📥 {collected} comentários coletados | 🧠 {stats_acc.total} analisados")
+        finally:
+            # Erro na análise de uma página: libera o produtor, que pode estar bloqueado na fila cheia
+            stop.set()
+            producer.join()
+            if METRICS_ENABLED:
+                METRICS.record_stage("fetch", fetch_seconds)
+                METRICS.record_stage("analysis", analysis_seconds)
+
+        # Modo incremental: mantém os comentários antigos que não vieram nesta coleta
+        previous = checkpoint.previous_records(seen_ids)
+        if previous:
+            append_records(
+                raw_path,
+                [previous_raw[r["comment_id"]] for r in previous if r["comment_id"] in previous_raw],
+            )
+            append_records(analyzed_path, previous)
+            stats_acc.update(previous)
+
+        if stats_acc.total == 0:
+            checkpoint.clear()
+            print("⚠ Nenhum comentário encontrado.")
+            return None
+
+        # O agrupamento precisa de todos os registros: regrava o JSONL já anotado
+        clusters = []
+        if SEMANTIC_CLUSTERING and stats_acc.total >= CLUSTER_MIN_COMMENTS:
+            analyzed_all = list(iter_jsonl(analyzed_path))
+            with stage_timer("cluster"):
+                clusters = apply_semantic_clustering(video_id, analyzed_all)
+            os.remove(analyzed_path)
+            append_jsonl(analyzed_path, analyzed_all)
+            del analyzed_all
+
+        with stage_timer("summary"):
+            resumo = generate_final_summary(iter_jsonl(analyzed_path))
+        print("📝 Resumo gerado.")
+
+        with stage_timer("stats"):
+            stats = stats_acc.to_dict()
+            if clusters:
+                stats["clusters"] = clusters
+
+        with stage_timer("save"):
+            save_json(f"{base_dir}/stats_resumo_{video_id}.json", stats)
+            index_video(video_id, iter_jsonl(analyzed_path))
+            checkpoint.clear()
+        print("💾 Arquivos salvos.")
+
+        if with_pdf:
+            with stage_timer("pdf"):
+                render_pdf_report(
+                    pdf_executor,
+                    video_id=video_id,
+                    resumo=resumo,
+                    stats=stats,
+                    analyzed=list(iter_jsonl(analyzed_path)),
+                    order_used=order
+                )
+
+        return stats
+
+
+# ============================================================
+# AGENDADOR DE VÍDEOS (vários vídeos em paralelo)
+# ============================================================
+
+MAX_PARALLEL_VIDEOS = 4
+PDF_WORKERS = 2            # processos para PDF/wordcloud (CPU)
+MAX_COMMENTS_PER_VIDEO = 30
+
+
+def render_pdf_report(pdf_executor=None, **kwargs):
+    """Gera o PDF no pool de processos, se houver; senão, no processo atual."""
+    if pdf_executor is None:
+        return generate_pdf_report(**kwargs)
+    return pdf_executor.submit(generate_pdf_report, **kwargs).result()
+
+
+def load_video_ids(path: str) -> list:
+    """
+    Um ID por linha; linhas vazias são ignoradas. O que vem após `#`
+    ("Artista - Título") vai para VIDEO_NOTES e alimenta o índice analítico.
+    """
+    ids = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            vid, _, note = line.partition("#")
+            vid = vid.strip()
+            if vid:
+                ids.append(vid)
+                if note.strip():
+                    VIDEO_NOTES[vid] = note.strip()
+    return ids
+
+
+def process_video(
+    vid: str,
+    max_comments: int = MAX_COMMENTS_PER_VIDEO,
+    order: str = "relevance",
+    pdf_executor=None,
+) -> bool:
+    """Pipeline completo de um vídeo. Retorna True se concluído."""
+    inicio_video = time.time()
+    _TRACE_VIDEO.set(vid)
+
+    print("-----------------------------------------------")
+
+    try:
+        if STREAMING_PIPELINE:
+            if run_streaming_pipeline(vid, max_comments=max_comments, order=order, pdf_executor=pdf_executor) is None:
+                return False
+        else:
+            # 1) Coleta de comentários
+            with stage_timer("fetch"):
+                comments, order_used = extract_youtube_comments(vid, max_comments=max_comments, order=order)
+            print(f"📥 Comentários coletados: {len(comments)}")
+
+            # Se não houver comentários, pular vídeo
+            if len(comments) == 0:
+                print("⚠ Nenhum comentário encontrado. Pulando vídeo.")
+                return False
+
+            # 2) Análise dos comentários (pula o que já está no checkpoint)
+            with AnalysisCheckpoint(vid, incremental=INCREMENTAL_ANALYSIS) as checkpoint:
+                pending = checkpoint.pending(comments)
+                print(f"♻ {len(comments) - len(pending)} já analisados | {len(pending)} pendentes")
+
+                with stage_timer("analysis"):
+                    if pending:
+                        analyze_comments(pending, on_record=checkpoint.record)
+                    analyzed = checkpoint.merge(comments)
+                    comments = checkpoint.merge_raw(comments)
+                print("🧠 Análise concluída.")
+
+                with stage_timer("cluster"):
+                    clusters = apply_semantic_clustering(vid, analyzed)
+
+                # 3) Resumo geral dos comentários
+                with stage_timer("summary"):
+                    resumo = generate_final_summary(analyzed)
+                print("📝 Resumo gerado.")
+
+                # 4) Estatísticas gerais
+                with stage_timer("stats"):
+                    stats = generate_stats(analyzed, trends=checkpoint.trends(analyzed))
+                    if clusters:
+                        stats["clusters"] = clusters
+                print("📊 Estatísticas calculadas.")
+
+                # 5) Salvamento em arquivos organizados
+                with stage_timer("save"):
+                    save_outputs_for_video(
+                        video_id=vid,
+                        comments=comments,
+                        analyzed=analyzed,
+                        resumo=resumo,
+                        stats=stats
+                    )
+                    checkpoint.clear()
+                print("💾 Arquivos salvos.")
+
+                # 6) Gerar PDF consolidado
+                with stage_timer("pdf"):
+                    render_pdf_report(
+                        pdf_executor,
+                        video_id=vid,
+                        resumo=resumo,
+                        stats=stats,
+                        analyzed=analyzed,
+                        order_used=order_used
+                    )
+                print("📄 PDF gerado com sucesso.")
+
+    except Exception as e:
+        print(f"❌ ERRO ao processar o vídeo {vid}: {e}")
+        return False
+
+    fim_video = time.time()
+    if METRICS_ENABLED:
+        METRICS.record_stage("video", fim_video - inicio_video)
+        METRICS.flush()
+    print(f"⏱ Tempo total: {fim_video - inicio_video:.2f} segundos")
+    print(f"✔ Finalizado: youtube_comments/{vid}")
+    print("-----------------------------------------------")
+    return True
+
+
+def run_video_jobs(
+    video_ids,
+    max_parallel: int = MAX_PARALLEL_VIDEOS,
+    pdf_workers: int = PDF_WORKERS,
+    **video_kwargs,
+) -> dict:
+    """
+    Processa vários vídeos ao mesmo tempo (no máximo `max_parallel`).
+    Os limites de taxa (YouTube e LLM) são globais e compartilhados entre
+    todos os vídeos; PDFs e wordclouds vão para um pool de processos.
+    """
+    results = {}
+
+    # "spawn": um fork copiaria, no meio da execução, locks das threads de vídeo
+    # e conexões SQLite abertas (cache LLM, índice analítico) para os workers
+    pdf_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, pdf_workers), mp_context=pdf_context) as pdf_pool, \
+            ThreadPoolExecutor(max_workers=max(1, max_parallel)) as video_pool:
+        futures = {
+            vid: video_pool.submit(process_video, vid, pdf_executor=pdf_pool, **video_kwargs)
+            for vid in video_ids
+        }
+        for vid, fut in futures.items():
+            results[vid] = fut.result()
+
+    return results
+
+
+IMPORT_TIME = time.perf_counter() - _IMPORT_START
+
+
+def report_import_time(budget: float = IMPORT_TIME_BUDGET):
+    status = "✔" if IMPORT_TIME <= budget else "⚠ acima do orçamento"
+    print(f"⏱ Importação do módulo: {IMPORT_TIME * 1000:.0f} ms (orçamento {budget * 1000:.0f} ms) {status}")
+
 
 # ============================================================
 # EXECUÇÃO PRINCIPAL
 # ============================================================
 
 if __name__ == "__main__":
-    import time
+
+    # Consultas ao índice analítico: python main.py analytics <comando> ...
+    if len(sys.argv) > 1 and sys.argv[1] == "analytics":
+        raise SystemExit(analytics_cli(sys.argv[2:]))
 
     VIDEO_IDS = [
         "8xg3vE8Ie_E",  # Raimundos - Quero ver o Oco
@@ -797,65 +4979,30 @@ if __name__ == "__main__":
         #"AkFqg5wAuFk", # Pantera - Walk
     ]
 
+    # Alternativa: arquivo com um ID por linha (ex.: VIDEO_IDS_FILE=videos.txt)
+    if os.getenv("VIDEO_IDS_FILE"):
+        VIDEO_IDS = load_video_ids(os.getenv("VIDEO_IDS_FILE"))
+
+    report_import_time()
+
     print("\n===============================================")
     print(" INICIANDO PROCESSAMENTO DOS VÍDEOS DO YOUTUBE ")
     print("===============================================\n")
 
-    for vid in VIDEO_IDS:
-        inicio_video = time.time()
-
-        print("-----------------------------------------------")
+    results = run_video_jobs(VIDEO_IDS)
+    print(f"📋 Vídeos concluídos: {sum(results.values())}/{len(results)}")
 
-        try:
-            # 1) Coleta de comentários
-            comments, order_used = extract_youtube_comments(vid, max_comments=30)
-            print(f"📥 Comentários coletados: {len(comments)}")
-
-            # Se não houver comentários, pular vídeo
-            if len(comments) == 0:
-                print("⚠ Nenhum comentário encontrado. Pulando vídeo.")
-                continue
-
-            # 2) Análise dos comentários
-            analyzed = analyze_comments(comments)
-            print("🧠 Análise concluída.")
-
-            # 3) Resumo geral dos comentários
-            resumo = generate_final_summary(analyzed)
-            print("📝 Resumo gerado.")
-
-            # 4) Estatísticas gerais
-            stats = generate_stats(analyzed)
-            print("📊 Estatísticas calculadas.")
-
-            # 5) Salvamento em arquivos organizados
-            save_outputs_for_video(
-                video_id=vid,
-                comments=comments,
-                analyzed=analyzed,
-                resumo=resumo,
-                stats=stats
-            )
-            print("💾 Arquivos salvos.")
-
-            # 6) Gerar PDF consolidado
-            generate_pdf_report(
-                video_id=vid,
-                resumo=resumo,
-                stats=stats,
-                analyzed=analyzed,
-                order_used=order_used
-            )
-            print("📄 PDF gerado com sucesso.")
-
-        except Exception as e:
-            print(f"❌ ERRO ao processar o vídeo {vid}: {e}")
-            continue
+    if _LLM_CACHE is not None:
+        _LLM_CACHE.flush()
+        cache_stats = _LLM_CACHE.stats()
+        print(
+            f"🗄 Cache LLM: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"({cache_stats['hit_rate']:.0%})"
+        )
 
-        fim_video = time.time()
-        print(f"⏱ Tempo total: {fim_video - inicio_video:.2f} segundos")
-        print(f"✔ Finalizado: youtube_comments/{vid}")
-        print("-----------------------------------------------")
+    if METRICS_ENABLED:
+        METRICS.print_summary()
+        METRICS.flush()
+        print(f"📈 Métricas: {METRICS.write_prometheus()} | traces: {TRACE_PATH}")
 
     print("\n🎉 PROCESSAMENTO FINALIZADO PARA TODOS OS VÍDEOS!\n")
-
@@ -0,0 +1,59 @@
+import main
+
+
+def _record(cid, text):
+    return {"comment_id": cid, "text": text, "sentiment": "neutro"}
+
+
+def test_checkpoint_resumes_after_interruption(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    comments = [{"comment_id": "a", "text": "um"}, {"comment_id": "b", "text": "dois"}]
+
+    with main.AnalysisCheckpoint("vid", incremental=False) as checkpoint:
+        assert checkpoint.pending(comments) == comments
+        checkpoint.record(_record("a", "um"))
+
+    resumed = main.AnalysisCheckpoint("vid", incremental=False)
+    assert resumed.pending(comments) == [comments[1]]
+    resumed.record(_record("b", "dois"))
+    assert [r["comment_id"] for r in resumed.merge(comments)] == ["a", "b"]
+
+    resumed.clear()
+    assert not (tmp_path / "youtube_comments/vid/checkpoint_analise_vid.jsonl").exists()
+
+
+def test_checkpoint_reanalyzes_edited_comments(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with main.AnalysisCheckpoint("vid", incremental=False) as checkpoint:
+        checkpoint.record(_record("a", "texto original"))
+
+    with main.AnalysisCheckpoint("vid", incremental=False) as checkpoint:
+        edited = {"comment_id": "a", "text": "texto editado"}
+        assert checkpoint.pending([edited]) == [edited]
+
+
+def test_checkpoint_closes_file_on_error(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    try:
+        with main.AnalysisCheckpoint("vid", incremental=False) as checkpoint:
+            checkpoint.record(_record("a", "um"))
+            handle = checkpoint._file
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert handle.closed
+
+
+def test_incremental_checkpoint_drops_stale_cluster_fields(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "COLUMNAR_FORMAT", False)
+    previous = {**_record("a", "um"), "cluster": 3, "cluster_size": 40, "cluster_representative": True}
+    (tmp_path / "youtube_comments/vid").mkdir(parents=True)
+    main.append_jsonl("youtube_comments/vid/comentarios_analisados_vid.jsonl", [previous])
+
+    with main.AnalysisCheckpoint("vid", incremental=True) as checkpoint:
+        merged = checkpoint.merge([{"comment_id": "b", "text": "dois"}])
+
+    assert [r["comment_id"] for r in merged] == ["a"]
+    assert not set(main.CLUSTER_FIELDS) & set(merged[0])
@@ -0,0 +1,25 @@
+import main
+
+
+def test_group_duplicates_exact_after_normalization():
+    groups = main.group_duplicates(["Que música!", "que   MÚSICA", "outra coisa"], threshold=1.0)
+    assert [0, 1] in groups
+    assert [2] in groups
+
+
+def test_group_duplicates_near_duplicates():
+    base = "essa música me lembra a minha infância com meu pai no carro"
+    groups = main.group_duplicates([base, base + " demais", "nada a ver com o resto do texto"])
+    assert [0, 1] in groups
+
+
+def test_group_duplicates_keeps_empty_normalizations_apart():
+    texts = ["💯💯💯", "🥲", "?", "!!!", "🤘", "💯💯💯"]
+    groups = main.group_duplicates(texts)
+    assert sorted(groups) == [[0, 5], [1], [2], [3], [4]]
+
+
+def test_group_duplicates_reads_threshold_flag(monkeypatch):
+    base = "essa música me lembra a minha infância com meu pai no carro"
+    monkeypatch.setattr(main, "DEDUP_THRESHOLD", 1.0)
+    assert main.group_duplicates([base, base + " demais"]) == [[0], [1]]
@@ -0,0 +1,105 @@
+import pytest
+
+import main
+
+pytest.importorskip("googleapiclient")
+
+
+class Request:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return self.fn()
+
+
+class FakeYouTube:
+    """commentThreads/comments com paginação por índice; `fail_on_page` simula queda persistente."""
+
+    def __init__(self, threads=12, page_size=5, replies=None, inline=1, fail_on_page=None):
+        self.threads = threads
+        self.page_size = page_size
+        self.replies = replies or {}
+        self.inline = inline
+        self.fail_on_page = fail_on_page
+        self.thread_pages = 0
+
+    def commentThreads(self):
+        return self
+
+    def comments(self):
+        return FakeReplies(self)
+
+    @staticmethod
+    def _comment(cid, parent=None):
+        snippet = {"textDisplay": f"texto {cid}", "likeCount": 0}
+        if parent:
+            snippet["parentId"] = parent
+        return {"id": cid, "snippet": snippet}
+
+    def list(self, **kwargs):
+        def run():
+            self.thread_pages += 1
+            if self.fail_on_page and self.thread_pages >= self.fail_on_page:
+                raise ConnectionError("queda simulada")
+            start = int(kwargs.get("pageToken") or 0)
+            items = []
+            for i in range(start, min(start + self.page_size, self.threads)):
+                tid = f"t{i}"
+                total = self.replies.get(tid, 0)
+                item = {"id": tid, "snippet": {"totalReplyCount": total,
+                                               "topLevelComment": self._comment(tid)}}
+                if total:
+                    item["replies"] = {"comments": [
+                        self._comment(f"{tid}.r{j}", tid) for j in range(min(total, self.inline))
+                    ]}
+                items.append(item)
+            response = {"items": items}
+            if start + self.page_size < self.threads:
+                response["nextPageToken"] = str(start + self.page_size)
+            return response
+        return Request(run)
+
+
+class FakeReplies:
+    def __init__(self, yt):
+        self.yt = yt
+
+    def list(self, **kwargs):
+        parent = kwargs["parentId"]
+        total = self.yt.replies.get(parent, 0)
+        return Request(lambda: {"items": [FakeYouTube._comment(f"{parent}.r{j}", parent) for j in range(total)]})
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main.time, "sleep", lambda s: None)
+    return tmp_path
+
+
+def _ids(pages):
+    return [c["comment_id"] for page in pages for c in page]
+
+
+def test_expands_threads_with_missing_inline_replies(workdir, monkeypatch):
+    yt = FakeYouTube(threads=3, replies={"t0": 3, "t1": 1}, inline=1)
+    monkeypatch.setattr(main, "_youtube_client", lambda: yt)
+
+    ids = _ids(main.iter_youtube_comment_pages("vid", max_comments=10, include_replies=True, resume=False))
+
+    assert ids == ["t0", "t0.r0", "t0.r1", "t0.r2", "t1", "t1.r0", "t2"]
+
+
+def test_resumes_from_saved_page_token(workdir, monkeypatch):
+    failing = FakeYouTube(threads=12, fail_on_page=2)
+    monkeypatch.setattr(main, "_youtube_client", lambda: failing)
+    with pytest.raises(ConnectionError):
+        list(main.iter_youtube_comment_pages("vid", max_comments=12))
+
+    yt = FakeYouTube(threads=12)
+    monkeypatch.setattr(main, "_youtube_client", lambda: yt)
+    ids = _ids(main.iter_youtube_comment_pages("vid", max_comments=12))
+
+    assert ids == [f"t{i}" for i in range(12)]
+    assert yt.thread_pages == 2  # a primeira página veio do disco
@@ -0,0 +1,24 @@
+import main
+
+
+def test_portuguese_plurals():
+    words = ["músicas", "canções", "animais", "papéis", "mães", "flores", "homens", "lápis"]
+    assert [main.normalize_keyword(w, "pt")[1] for w in words] == [
+        "música", "canção", "animal", "papel", "mãe", "flor", "homem", "lápis",
+    ]
+
+
+def test_english_keywords_skip_portuguese_rules():
+    words = ["fans", "scores", "genres", "horns", "memories", "songs"]
+    assert [main.normalize_keyword(w, "en")[1] for w in words] == [
+        "fan", "score", "genre", "horn", "memory", "song",
+    ]
+
+
+def test_keyword_index_uses_record_language():
+    index = main.KeywordIndex()
+    index.update([
+        {"language": "en", "keywords": "horns, Fans"},
+        {"language": "pt", "keywords": "cantores, fans"},
+    ])
+    assert index.most_common() == {"fan": 2, "horn": 1, "cantor": 1}
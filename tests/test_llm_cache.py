@@ -0,0 +1,41 @@
+import main
+
+
+def _key(text):
+    return main.LLMCache.make_key("sentiment", "template", "modelo", 0.0, {"text": text})
+
+
+def test_cache_persists_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = main.LLMCache(path)
+    assert cache.get(_key("a")) is None
+    cache.set(_key("a"), "sentiment", "positivo")
+
+    reopened = main.LLMCache(path)
+    assert reopened.get(_key("a")) == "positivo"
+    assert reopened.stats()["hits"] == 1
+
+
+def test_cache_key_depends_on_every_component():
+    base = ("sentiment", "template", "modelo", 0.0, {"text": "a"})
+    keys = {main.LLMCache.make_key(*base)}
+    for i, changed in enumerate(("emotion", "outro template", "outro modelo", 0.7, {"text": "b"})):
+        args = list(base)
+        args[i] = changed
+        keys.add(main.LLMCache.make_key(*args))
+    assert len(keys) == 6
+
+
+def test_eviction_keeps_recently_used_entries(tmp_path, monkeypatch):
+    clock = iter(range(1_000_000, 2_000_000))
+    monkeypatch.setattr(main.time, "time", lambda: next(clock))
+    cache = main.LLMCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    for text in "abc":
+        cache.set(_key(text), "sentiment", text)
+
+    cache.get(_key("a"))       # usado por último: sobrevive à evicção
+    cache.evict()
+
+    assert cache.get(_key("a")) == "a"
+    assert cache.get(_key("b")) is None
+    assert cache.get(_key("c")) == "c"
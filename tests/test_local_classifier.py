@@ -0,0 +1,49 @@
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+import main
+
+pytest.importorskip("sklearn")
+
+
+def _records(n=240):
+    records = []
+    for i in range(n):
+        positive = i % 2 == 0
+        records.append({
+            "emoji_expanded": f"{'amei demais essa música linda' if positive else 'odiei, que música horrível'} {i}",
+            "sentiment": "positivo" if positive else "negativo",
+            "emotion": "alegria" if positive else "raiva",
+            "context": "sobre_a_musica",
+        })
+    # `context` precisa de ao menos duas classes para ser treinado
+    for r in records[::3]:
+        r["context"] = "experiencia_pessoal"
+    return records
+
+
+def test_saved_model_loads_without_the_defining_module(tmp_path):
+    path = str(tmp_path / "modelo.pkl")
+    classifier = main.LocalClassifier().fit(_records())
+    assert classifier.ready
+    classifier.save(path)
+
+    # Outro processo, sem importar main: o arquivo só pode conter objetos do sklearn
+    code = f"import joblib; state = joblib.load({path!r}); print(sorted(state['models']))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == str(sorted(main.LABEL_SETS))
+
+    loaded = main.LocalClassifier.load(path)
+    texts = ["amei demais", "que horrível"]
+    assert loaded.trained_on == classifier.trained_on
+    assert loaded.predict(texts) == classifier.predict(texts)
+
+
+def test_load_rejects_old_pickles(tmp_path):
+    path = tmp_path / "modelo.pkl"
+    path.write_bytes(pickle.dumps(main.LocalClassifier()))
+
+    assert main.LocalClassifier.load(str(path)) is None
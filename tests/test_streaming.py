@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+
+import main
+
+
+def _comments(start, n):
+    return [
+        {"comment_id": f"c{i}", "text": f"comentário número {i}", "like_count": i,
+         "published_at": "2026-01-05T10:00:00Z"}
+        for i in range(start, start + n)
+    ]
+
+
+def _label(comments, on_record=None, **_):
+    results = []
+    for c in comments:
+        record = {**c, "emoji_expanded": c["text"], "language": "pt", "translated": c["text"],
+                  "sentiment": "positivo", "emotion": "alegria", "keywords": "música",
+                  "context": "sobre_a_musica"}
+        if on_record is not None:
+            on_record(record)
+        results.append(record)
+    return results
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "COLUMNAR_FORMAT", None)
+    monkeypatch.setattr(main, "SEMANTIC_CLUSTERING", False)
+    monkeypatch.setattr(main, "METRICS_ENABLED", False)
+    monkeypatch.setattr(main, "generate_final_summary", lambda records, *a, **k: "resumo")
+    return tmp_path
+
+
+def test_streaming_pipeline_writes_stats(workdir, monkeypatch):
+    pages = [_comments(0, 3), _comments(3, 2)]
+    monkeypatch.setattr(main, "iter_youtube_comment_pages", lambda *a, **k: iter(pages))
+    monkeypatch.setattr(main, "analyze_comments", _label)
+
+    stats = main.run_streaming_pipeline("vid", max_comments=5, with_pdf=False, incremental=False)
+
+    assert stats["sentiment_counts"] == {"positivo": 5}
+    assert len(list(main.iter_jsonl("youtube_comments/vid/comentarios_analisados_vid.jsonl"))) == 5
+    assert not (workdir / "youtube_comments/vid/checkpoint_analise_vid.jsonl").exists()
+
+
+def test_streaming_pipeline_analysis_error_stops_producer(workdir, monkeypatch):
+    closed = threading.Event()
+
+    def endless_pages(*args, **kwargs):
+        try:
+            start = 0
+            while True:
+                yield _comments(start, 2)
+                start += 2
+        finally:
+            closed.set()
+
+    def failing_analysis(comments, on_record=None, **kwargs):
+        if comments[0]["comment_id"] != "c0":
+            raise RuntimeError("LLM indisponível")
+        return _label(comments, on_record=on_record)
+
+    monkeypatch.setattr(main, "STREAM_QUEUE_PAGES", 1)
+    monkeypatch.setattr(main, "STREAM_PUT_TIMEOUT", 0.05)
+    monkeypatch.setattr(main, "iter_youtube_comment_pages", endless_pages)
+    monkeypatch.setattr(main, "analyze_comments", failing_analysis)
+    before = threading.active_count()
+
+    with pytest.raises(RuntimeError):
+        main.run_streaming_pipeline("vid", max_comments=100, with_pdf=False, incremental=False)
+
+    assert closed.wait(2)
+    assert threading.active_count() == before
+
+    # O que foi analisado antes da falha fica no checkpoint para a próxima execução
+    checkpoint = main.AnalysisCheckpoint("vid", incremental=False)
+    assert set(checkpoint.done) == {"c0", "c1"}
+    checkpoint.close()
+
+
+def test_streaming_pipeline_fetch_error_propagates(workdir, monkeypatch):
+    def broken_pages(*args, **kwargs):
+        yield _comments(0, 2)
+        raise ConnectionError("quota")
+
+    monkeypatch.setattr(main, "iter_youtube_comment_pages", broken_pages)
+    monkeypatch.setattr(main, "analyze_comments", _label)
+
+    with pytest.raises(ConnectionError):
+        main.run_streaming_pipeline("vid", max_comments=10, with_pdf=False, incremental=False)
+
+
+def test_streaming_pipeline_records_stages_once_per_video(workdir, monkeypatch):
+    pages = [_comments(0, 2), _comments(2, 2), _comments(4, 2)]
+    metrics = main.Metrics(trace_path=str(workdir / "traces.jsonl"))
+    monkeypatch.setattr(main, "METRICS_ENABLED", True)
+    monkeypatch.setattr(main, "METRICS", metrics)
+    monkeypatch.setattr(main, "iter_youtube_comment_pages", lambda *a, **k: iter(pages))
+    monkeypatch.setattr(main, "analyze_comments", _label)
+
+    main.run_streaming_pipeline("vid", max_comments=6, with_pdf=False, incremental=False)
+
+    assert len(metrics.stages["fetch"]) == 1
+    assert len(metrics.stages["analysis"]) == 1
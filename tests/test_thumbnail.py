@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import main
+
+pytest.importorskip("requests")
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", etag=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {"ETag": etag} if etag else {}
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls.append((url, dict(headers or {})))
+        return self.responses[url]
+
+
+MAXRES = "https://img.youtube.com/vi/vid/maxresdefault.jpg"
+HQ = "https://img.youtube.com/vi/vid/hqdefault.jpg"
+
+
+def _cached(tmp_path, etag):
+    (tmp_path / "thumbnail_vid.jpg").write_bytes(b"old" * 1000)
+    (tmp_path / "thumbnail_vid.meta.json").write_text(json.dumps({"url": MAXRES, "etag": etag}))
+
+
+def test_revalidation_304_keeps_cached_file(tmp_path, monkeypatch):
+    _cached(tmp_path, '"v1"')
+    session = FakeSession({MAXRES: FakeResponse(304)})
+    monkeypatch.setattr(main, "http_session", lambda: session)
+
+    assert main.fetch_thumbnail("vid", str(tmp_path)) == f"{tmp_path}/thumbnail_vid.jpg"
+    assert session.calls == [(MAXRES, {"If-None-Match": '"v1"'})]
+
+
+def test_revalidation_200_stores_new_body_without_refetching(tmp_path, monkeypatch):
+    _cached(tmp_path, '"v1"')
+    session = FakeSession({MAXRES: FakeResponse(200, b"new" * 1000, etag='"v2"')})
+    monkeypatch.setattr(main, "http_session", lambda: session)
+
+    main.fetch_thumbnail("vid", str(tmp_path))
+
+    assert len(session.calls) == 1
+    assert (tmp_path / "thumbnail_vid.jpg").read_bytes() == b"new" * 1000
+    assert json.loads((tmp_path / "thumbnail_vid.meta.json").read_text())["etag"] == '"v2"'
+
+
+def test_falls_back_to_hq_when_maxres_missing(tmp_path, monkeypatch):
+    session = FakeSession({MAXRES: FakeResponse(404), HQ: FakeResponse(200, b"hq" * 1000)})
+    monkeypatch.setattr(main, "http_session", lambda: session)
+
+    assert main.fetch_thumbnail("vid", str(tmp_path))
+    assert json.loads((tmp_path / "thumbnail_vid.meta.json").read_text())["url"] == HQ